@@ -4,9 +4,24 @@ GRAPHITE_API = os.environ.get('GRAPHITE_API')
 GRAPHITE_USER = os.environ.get('GRAPHITE_USER')
 GRAPHITE_PASS = os.environ.get('GRAPHITE_PASS')
 GRAPHITE_FROM = os.getenv('GRAPHITE_FROM', '-10minute')
+# Number of targets fetched by a single Graphite render request
+GRAPHITE_RENDER_BATCH_SIZE = int(os.environ.get('GRAPHITE_RENDER_BATCH_SIZE', '50'))
 JENKINS_API = os.environ.get('JENKINS_API')
 JENKINS_USER = os.environ.get('JENKINS_USER')
 JENKINS_PASS = os.environ.get('JENKINS_PASS')
+# Answer Jenkins checks from one request listing every job in a folder,
+# shared by the checks for JENKINS_BULK_CACHE_TTL seconds, rather than a
+# request per job
+JENKINS_BULK_STATUS = os.environ.get('JENKINS_BULK_STATUS', 'true').lower() == 'true'
+JENKINS_BULK_CACHE_TTL = int(os.environ.get('JENKINS_BULK_CACHE_TTL', '60'))
+# Token that Jenkins' Notification plugin authenticates to /jenkins/notify/
+# with, e.g. https://cabot.example.com/jenkins/notify/?token=... Once set,
+# Jenkins checks are only polled every JENKINS_RECONCILE_INTERVAL minutes
+# (or their frequency, if longer) to catch missed notifications
+JENKINS_WEBHOOK_TOKEN = os.environ.get('JENKINS_WEBHOOK_TOKEN', '')
+JENKINS_RECONCILE_INTERVAL = int(os.environ.get('JENKINS_RECONCILE_INTERVAL', '30'))
+# Builds the webhook queues are recorded at most this many at a time
+JENKINS_WEBHOOK_BATCH_SIZE = int(os.environ.get('JENKINS_WEBHOOK_BATCH_SIZE', '1000'))
 CALENDAR_ICAL_URL = os.environ.get('CALENDAR_ICAL_URL')
 WWW_HTTP_HOST = os.environ.get('WWW_HTTP_HOST')
 WWW_SCHEME = os.environ.get('WWW_SCHEME', "https")
@@ -14,10 +29,73 @@ ALERT_INTERVAL = os.environ.get('ALERT_INTERVAL', 10)
 NOTIFICATION_INTERVAL = os.environ.get('NOTIFICATION_INTERVAL', 120)
 INFLUXDB_DSN = os.environ.get('INFLUXDB_DSN')
 INFLUXDB_TIMEOUT = os.environ.get('INFLUXDB_TIMEOUT', 30)
+# '0.8', or '1.x' for the InfluxDB 1.x HTTP API
 INFLUXDB_VERSION = os.environ.get('INFLUXDB_VERSION', '0.8')
 INFLUXDB_FROM = int(os.environ.get('INFLUXDB_FROM', '60'))
 INFLUXDB_LIMIT = int(os.environ.get('INFLUXDB_LIMIT', '100'))
 
+# Maximum number of due checks dispatched by a single run of the scheduler
+CHECK_SCHEDULE_BATCH_SIZE = int(os.environ.get('CHECK_SCHEDULE_BATCH_SIZE', '5000'))
+# Spread checks that have never run over their first period, rather than
+# running them all on the next scheduler tick
+CHECK_SCHEDULE_WARMUP = os.environ.get('CHECK_SCHEDULE_WARMUP', 'true').lower() == 'true'
+# Seconds a dispatched check that hasn't run yet, most likely still waiting
+# in a lagging queue, is left alone before it is taken as lost and
+# dispatched again
+CHECK_DISPATCH_TIMEOUT = int(os.environ.get('CHECK_DISPATCH_TIMEOUT', '3600'))
+# Dispatch checks from `manage.py run_scheduler` nodes instead of the single
+# celery beat `run_all_checks` task
+CHECK_SCHEDULER_SHARDED = os.environ.get('CHECK_SCHEDULER_SHARDED', 'false').lower() == 'true'
+# Seconds without a heartbeat after which a scheduler node's shard is
+# handed over to the remaining nodes
+SCHEDULER_NODE_TIMEOUT = int(os.environ.get('SCHEDULER_NODE_TIMEOUT', '180'))
+
+# Checks due in the same second are sent to the workers in batches of up to
+# this many, and each batch runs this many checks at once
+CHECK_BATCH_SIZE = int(os.environ.get('CHECK_BATCH_SIZE', '20'))
+CHECK_BATCH_CONCURRENCY = int(os.environ.get('CHECK_BATCH_CONCURRENCY', '10'))
+# Pooled HTTP connections, kept alive and shared by the checks and the
+# graphite/jenkins/calendar clients of each worker process: number of hosts
+# to keep pools for, connections kept per host (overridden per host by
+# HTTP_POOL_HOST_SIZES, e.g. "graphite.example.com=20,jenkins:8080=4"), and
+# the timeout in seconds for requests that don't set their own
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', '100'))
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '10'))
+HTTP_POOL_HOST_SIZES = os.environ.get('HTTP_POOL_HOST_SIZES', '')
+HTTP_POOL_TIMEOUT = int(os.environ.get('HTTP_POOL_TIMEOUT', '30'))
+
+# HTTP checks in a batch run this many at once, each on a greenlet when the
+# workers run on the gevent pool (`celery worker -P gevent`, as in the
+# Procfile), or else on a thread
+HTTP_CHECK_CONCURRENCY = int(os.environ.get('HTTP_CHECK_CONCURRENCY', '100'))
+# HTTP checks stop reading the response body after this many bytes when
+# looking for their text match
+HTTP_CHECK_MAX_BODY_BYTES = int(os.environ.get('HTTP_CHECK_MAX_BODY_BYTES', '5242880'))
+
+# Seconds that metric query results are shared between checks running the
+# same query. 0 disables the cache
+METRIC_CACHE_TTL = int(os.environ.get('METRIC_CACHE_TTL', '30'))
+
+# Metric checks keep the points they fetched and the next run only fetches
+# newer ones, going back METRIC_WINDOW_OVERLAP seconds for points still
+# being written. Make the overlap at least the longest `group by time()`
+METRIC_INCREMENTAL_FETCH = os.environ.get('METRIC_INCREMENTAL_FETCH', 'true').lower() == 'true'
+METRIC_WINDOW_OVERLAP = int(os.environ.get('METRIC_WINDOW_OVERLAP', '60'))
+
+# Most results accepted by one request to the passive results API, and
+# results written per insert
+PASSIVE_INGEST_MAX_RESULTS = int(os.environ.get('PASSIVE_INGEST_MAX_RESULTS', '10000'))
+PASSIVE_INGEST_BATCH_SIZE = int(os.environ.get('PASSIVE_INGEST_BATCH_SIZE', '1000'))
+
+# Checks run by remote agents fail once no result has arrived for their
+# frequency plus this many seconds. Agent uploads are limited to this many
+# bytes once decompressed
+AGENT_RESULT_GRACE = int(os.environ.get('AGENT_RESULT_GRACE', '120'))
+AGENT_MAX_UPLOAD_BYTES = int(os.environ.get('AGENT_MAX_UPLOAD_BYTES', '52428800'))
+
+# Seconds to wait for the reply to each ICMP probe
+ICMP_TIMEOUT = float(os.environ.get('ICMP_TIMEOUT', '2'))
+
 # While displaying a list of available metrics, cabot will fetch the
 # actual metrics values only if the metrics list is lesser than this number
 METRIC_FETCH_LIMIT = int(os.environ.get('METRIC_FETCH_LIMIT', '20'))
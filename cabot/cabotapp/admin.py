@@ -6,7 +6,8 @@ from .models import (
     ServiceStatusSnapshot,
     StatusCheck,
     StatusCheckResult,
-    Instance
+    Instance,
+    SchedulerNode,
 )
 from .alert import AlertPluginUserData, AlertPlugin
 
@@ -17,5 +18,6 @@ admin.site.register(ServiceStatusSnapshot)
 admin.site.register(StatusCheck)
 admin.site.register(StatusCheckResult)
 admin.site.register(Instance)
+admin.site.register(SchedulerNode)
 admin.site.register(AlertPlugin)
 admin.site.register(AlertPluginUserData)
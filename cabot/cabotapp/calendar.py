@@ -1,11 +1,12 @@
 from django.conf import settings
 from icalendar import Calendar
-import requests
+
+from . import http_pool
 
 
 def get_calendar_data():
     feed_url = settings.CALENDAR_ICAL_URL
-    resp = requests.get(feed_url)
+    resp = http_pool.get(feed_url)
     cal = Calendar.from_ical(resp.content)
     return cal
 
@@ -1,6 +1,10 @@
 from django.conf import settings
 import requests
 import logging
+import re
+import urllib
+
+from . import http_pool, metric_summary
 
 graphite_api = settings.GRAPHITE_API
 user = settings.GRAPHITE_USER
@@ -8,23 +12,137 @@ password = settings.GRAPHITE_PASS
 graphite_from = settings.GRAPHITE_FROM
 auth = (user, password)
 
+# Render requests with a longer query string than this are sent as a POST,
+# as servers and proxies limit the length of a URL
+MAX_GET_LENGTH = 2000
 
-def get_data(target_pattern):
-    resp = requests.get(
-        graphite_api + 'render', auth=auth,
-        params={
-            'target': target_pattern,
-            'format': 'json',
-            'from': graphite_from
-        }
-    )
+
+def render(targets, from_=None, max_data_points=None):
+    """
+    Fetches all of `targets` from Graphite's render API in a single request.
+    With `max_data_points`, Graphite consolidates each series down to at
+    most that many points.
+    """
+    params = [('target', target) for target in targets]
+    params += [('format', 'json'), ('from', from_ or graphite_from)]
+    if max_data_points is not None:
+        params.append(('maxDataPoints', max_data_points))
+    url = graphite_api + 'render'
+    if len(urllib.urlencode(params)) > MAX_GET_LENGTH:
+        resp = http_pool.post(url, auth=auth, data=params)
+    else:
+        resp = http_pool.get(url, auth=auth, params=params)
     resp.raise_for_status()
-    return resp.json
+    return resp.json()
+
+
+def get_data(target_pattern):
+    return render([target_pattern])
+
+
+# Targets that have Graphite summarize all the series of a path pattern,
+# each consolidated to a single point: the max and min value, the sum and
+# number of values, and the numbers of series with data and in all
+AGGREGATE_TARGETS = (
+    ('max', "consolidateBy(maxSeries(%s),'max')"),
+    ('min', "consolidateBy(minSeries(%s),'min')"),
+    ('sum', "consolidateBy(sumSeries(%s),'sum')"),
+    ('count', "consolidateBy(sumSeries(isNonNull(%s)),'sum')"),
+    ('series_with_data', "countSeries(removeEmptySeries(%s))"),
+    ('series', "countSeries(%s)"),
+)
+
+
+def get_aggregates(target_pattern, points, step):
+    """
+    The aggregates in AGGREGATE_TARGETS over the last `points` points of
+    the series matching `target_pattern`, which have a point every `step`
+    seconds, as computed by Graphite, as a dict of name -> value (None if
+    there were no values).
+
+    Graphite aligns a window of `points * step` seconds to the series'
+    steps, so it holds exactly the last `points` points of each series.
+    """
+    targets = ["alias(%s,'%s')" % (target % target_pattern, name)
+               for name, target in AGGREGATE_TARGETS]
+    aggregates = dict((name, None) for name, _ in AGGREGATE_TARGETS)
+    for series in render(targets, from_='-%ds' % (points * step),
+                         max_data_points=1):
+        values = [t[0] for t in series['datapoints'] if t[0] is not None]
+        if values:
+            aggregates[series['target']] = values[-1]
+    return aggregates
+
+
+_glob_regexes = {}
+
+
+def _glob_regex(pattern):
+    """Regex matching the series names a Graphite path pattern expands to"""
+    regex = _glob_regexes.get(pattern)
+    if regex is None:
+        parts = []
+        i = 0
+        while i < len(pattern):
+            c = pattern[i]
+            if c == '*':
+                parts.append('[^.]*')
+            elif c == '?':
+                parts.append('[^.]')
+            elif c == '[' and ']' in pattern[i:]:
+                end = pattern.index(']', i)
+                parts.append(pattern[i:end + 1])
+                i = end
+            elif c == '{' and '}' in pattern[i:]:
+                end = pattern.index('}', i)
+                parts.append('(?:%s)' % '|'.join(
+                    re.escape(option)
+                    for option in pattern[i + 1:end].split(',')))
+                i = end
+            else:
+                parts.append(re.escape(c))
+            i += 1
+        regex = _glob_regexes[pattern] = re.compile('^%s$' % ''.join(parts))
+    return regex
+
+
+# Renames each series a batched target returns to start with the target's
+# index, as Graphite returns a series once for every target matching it
+TAGGED_TARGET = "aliasSub(%s,'^','%d:')"
+
+
+def get_data_many(target_patterns):
+    """
+    Fetches many target patterns in as few render calls as possible, and
+    returns a dict of pattern -> the series it matched.
+
+    Plain path patterns are fetched GRAPHITE_RENDER_BATCH_SIZE at a time,
+    each tagged with its index so the series it returns can be told apart
+    from the same series returned for an overlapping pattern. Targets that
+    apply functions can rename their series, so they're each fetched on
+    their own.
+    """
+    patterns = list(set(target_patterns))
+    data = dict((pattern, []) for pattern in patterns)
+    paths = sorted(p for p in patterns if '(' not in p)
+    size = settings.GRAPHITE_RENDER_BATCH_SIZE
+    for offset in range(0, len(paths), size):
+        batch = paths[offset:offset + size]
+        targets = [TAGGED_TARGET % (pattern, index)
+                   for index, pattern in enumerate(batch)]
+        for series in render(targets):
+            index, _, name = series['target'].partition(':')
+            series['target'] = name
+            data[batch[int(index)]].append(series)
+    for pattern in patterns:
+        if '(' in pattern:
+            data[pattern] = render([pattern])
+    return data
 
 
 def get_matching_metrics(pattern):
     print 'Getting metrics matching %s' % pattern
-    resp = requests.get(
+    resp = http_pool.get(
         graphite_api + 'metrics/find/', auth=auth,
         params={
             'query': pattern,
@@ -52,14 +170,26 @@ def get_all_metrics(limit=None):
     return metrics
 
 
-def parse_metric(metric, mins_to_check=5):
+def parse_metric(metric, mins_to_check=5, data=None, keep_values=False,
+                 aggregate=False, step=None):
     """
     Returns dict with:
     - num_series_with_data: Number of series with data
     - num_series_no_data: Number of total series
+    - num_values
     - max
     - min
     - average_value
+    - all_values, if `keep_values` is set
+
+    `data`, if given, is the already fetched series of the metric.
+
+    With `aggregate` set and the `step` in seconds between the points of
+    the series given, a plain path pattern is summarized by Graphite over
+    the same last `mins_to_check` points, and only the summary is fetched.
+    raw is then the aggregates as one-point series. Without a step, the
+    window can't be matched to the points, so patterns are fetched in full,
+    as are patterns with functions and `keep_values`.
     """
     ret = {
         'num_series_with_data': 0,
@@ -68,27 +198,58 @@ def parse_metric(metric, mins_to_check=5):
         'all_values': [],
         'raw': ''
     }
+    aggregate = (aggregate and step is not None and data is None and
+                 not keep_values and '(' not in metric)
+    if data is None:
+        try:
+            if aggregate:
+                return _parse_aggregates(get_aggregates(metric,
+                                                        mins_to_check, step))
+            data = get_data(metric)
+        except requests.exceptions.RequestException, e:
+            ret['error'] = 'Error getting data from Graphite: %s' % e
+            ret['raw'] = ret['error']
+            logging.error('Error getting data from Graphite: %s' % e)
+            return ret
+    ret = metric_summary.summarize(data, mins_to_check, keep_values)
+    ret['error'] = None
+    return ret
+
+
+def _parse_aggregates(aggregates):
+    with_data = int(aggregates['series_with_data'] or 0)
+    ret = {
+        'num_series_with_data': with_data,
+        'num_series_no_data': int(aggregates['series'] or 0) - with_data,
+        'num_values': int(aggregates['count'] or 0),
+        'error': None,
+        'raw': [dict(target=name, datapoints=[[aggregates[name], None]])
+                for name, _ in AGGREGATE_TARGETS],
+    }
+    if ret['num_values']:
+        ret['max'] = float(aggregates['max'])
+        ret['min'] = float(aggregates['min'])
+        ret['average_value'] = aggregates['sum'] / ret['num_values']
+    return ret
+
+
+def parse_metrics(metrics, mins_to_check=5, keep_values=False):
+    """
+    `parse_metric` for many metrics at once, fetched with batched render
+    calls. Returns a dict of metric -> result.
+    """
     try:
-        data = get_data(metric)
+        data = get_data_many(metrics)
     except requests.exceptions.RequestException, e:
-        ret['error'] = 'Error getting data from Graphite: %s' % e
-        ret['raw'] = ret['error']
         logging.error('Error getting data from Graphite: %s' % e)
-        return ret
-    all_values = []
-    for target in data:
-        values = [float(t[0])
-                  for t in target['datapoints'][-mins_to_check:] if t[0] is not None]
-        if values:
-            ret['num_series_with_data'] += 1
-        else:
-            ret['num_series_no_data'] += 1
-        all_values.extend(values)
-    if all_values:
-        ret['max'] = max(all_values)
-        ret['min'] = min(all_values)
-        ret['average_value'] = sum(all_values) / len(all_values)
-    ret['all_values'] = all_values
-    ret['raw'] = data
-    return ret
-
+        error = 'Error getting data from Graphite: %s' % e
+        return dict((metric, {
+            'num_series_with_data': 0,
+            'num_series_no_data': 0,
+            'error': error,
+            'all_values': [],
+            'raw': error,
+        }) for metric in metrics)
+    return dict((metric, parse_metric(metric, mins_to_check, data[metric],
+                                      keep_values))
+                for metric in data)
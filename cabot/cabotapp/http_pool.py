@@ -0,0 +1,119 @@
+"""
+Shared, pooled HTTP sessions for checks and backend clients.
+
+Every process gets its own `requests.Session`, so requests to the same host
+reuse kept-alive connections (and for HTTPS skip a new TLS handshake)
+instead of opening a new one each time. Sessions are never shared across a
+fork, as the pooled sockets would be shared with the parent.
+"""
+from __future__ import absolute_import
+
+import cookielib
+import os
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies a default timeout"""
+
+    def __init__(self, timeout=None, **kwargs):
+        self.timeout = timeout
+        super(PooledHTTPAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return super(PooledHTTPAdapter, self).send(request, **kwargs)
+
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def _parse_host_sizes(value):
+    """'host:port=size,...' -> {'host:port': size}"""
+    sizes = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            host, size = item.rsplit('=', 1)
+            sizes[host.strip()] = int(size)
+    return sizes
+
+
+def _make_adapter(maxsize):
+    return PooledHTTPAdapter(
+        timeout=settings.HTTP_POOL_TIMEOUT,
+        pool_connections=settings.HTTP_POOL_HOSTS,
+        pool_maxsize=maxsize,
+    )
+
+
+def _make_session():
+    session = requests.Session()
+    # Checks of unrelated endpoints share the session, so don't let cookies
+    # set by one leak into the next. Cookies still carry across redirects.
+    session.cookies.set_policy(cookielib.DefaultCookiePolicy(
+        allowed_domains=[]))
+    for scheme in ('http://', 'https://'):
+        session.mount(scheme, _make_adapter(settings.HTTP_POOL_MAXSIZE))
+    for host, size in _parse_host_sizes(settings.HTTP_POOL_HOST_SIZES).items():
+        for scheme in ('http://', 'https://'):
+            session.mount('%s%s' % (scheme, host), _make_adapter(size))
+    return session
+
+
+def get_session():
+    """The pooled session for this process"""
+    pid = os.getpid()
+    session = _sessions.get(pid)
+    if session is None:
+        with _lock:
+            session = _sessions.get(pid)
+            if session is None:
+                _sessions.clear()
+                session = _sessions[pid] = _make_session()
+    return session
+
+
+def request(method, url, **kwargs):
+    """`requests.request` over the pooled session"""
+    return get_session().request(method=method, url=url, **kwargs)
+
+
+def get(url, **kwargs):
+    """`requests.get` over the pooled session"""
+    kwargs.setdefault('allow_redirects', True)
+    return request('GET', url, **kwargs)
+
+
+def post(url, data=None, **kwargs):
+    """`requests.post` over the pooled session"""
+    return request('POST', url, data=data, **kwargs)
+
+
+def stats():
+    """
+    Connection counters for this process's open pools: requests made, new
+    connections opened, and requests that reused a kept-alive connection.
+    """
+    total_requests = 0
+    new_connections = 0
+    session = _sessions.get(os.getpid())
+    if session is not None:
+        adapters = set(session.adapters.values())
+        for adapter in adapters:
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    total_requests += pool.num_requests
+                    new_connections += pool.num_connections
+    return {
+        'requests': total_requests,
+        'new_connections': new_connections,
+        'reused_connections': total_requests - new_connections,
+    }
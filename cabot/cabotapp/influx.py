@@ -1,54 +1,49 @@
 import influxdb.influxdb08
 import logging
+import re
 
 from django.conf import settings
 from collections import defaultdict
 
+from . import influxdb_http, metric_cache, metric_summary, metric_window
+
 
 # Keep a globally configured client ready
 _influxdb_client = None
 
+AGGREGATES = ('max', 'min', 'mean', 'count')
+
 
-def _get_influxdb_client(influxdb_dsn=settings.INFLUXDB_DSN,
-                         timeout=settings.INFLUXDB_TIMEOUT,
-                         version=settings.INFLUXDB_VERSION):
+def _is_v1(version=None):
+    '''
+    True for the InfluxDB 1.x HTTP API, rather than 0.8
+    '''
+    return (version or settings.INFLUXDB_VERSION).startswith('1')
+
+
+def _get_influxdb_client(influxdb_dsn=None, timeout=None, version=None):
 
     # Keep a globally configured client ready
     global _influxdb_client
 
+    version = version or settings.INFLUXDB_VERSION
     if version == '0.8':
         client_kls = influxdb.influxdb08.InfluxDBClient
+    elif _is_v1(version):
+        client_kls = influxdb_http.InfluxDBHTTPClient
     else:
         raise ValueError('InfluxDB version %s is unsupported' % version)
 
     if _influxdb_client is None:
-        _influxdb_client = client_kls.from_DSN(influxdb_dsn, timeout=timeout)
+        _influxdb_client = client_kls.from_DSN(
+            influxdb_dsn or settings.INFLUXDB_DSN,
+            timeout=float(timeout or settings.INFLUXDB_TIMEOUT))
 
     return _influxdb_client
 
 
-def get_data(pattern, selector='value',
-             where_clause=None,
-             group_by=None,
-             fill_empty=None,
-             time_delta=settings.INFLUXDB_FROM,
-             limit=settings.INFLUXDB_LIMIT,
-             fetchall=False):
-    '''
-    Query a metric and its data from influxdb.
-    Return the value in a graphite compatible format
-
-    * selector - can be specified as
-                 'value'
-                 'mean(value)'
-                 'percentile(value, 95)'
-
-    * group_by - can be specified as
-                 'time(10s)'
-                 'time(60m), host'
-
-    * fill_empty - can be Null, or an integer value
-    '''
+def _build_query(pattern, selector, where_clause, group_by, fill_empty,
+                 time_delta, limit, since):
     if fill_empty is not None:
         fill_str = 'fill(%d)' % fill_empty
     else:
@@ -69,9 +64,14 @@ def get_data(pattern, selector='value',
         where_str = ''
 
     # Prepare a time limit for the the query
-    if time_delta is not None:
+    if since is not None:
+        time_str = 'time > %ds' % (since)
+    elif time_delta is not None:
         time_str = 'time > now() - %dm' % (time_delta)
+    else:
+        time_str = ''
 
+    if time_str:
         if where_str:
             where_str += ' and %s' % time_str
         else:
@@ -82,21 +82,90 @@ def get_data(pattern, selector='value',
     else:
         limit_str = ''
 
+    if _is_v1():
+        # Points come oldest first, and the where clause goes first
+        return 'select %s from /%s/ %s %s %s %s' % \
+            (selector, pattern, where_str, group_by, fill_str, limit_str)
+    return 'select %s from /%s/ %s %s %s %s order asc' % \
+        (selector, pattern, group_by, fill_str, where_str, limit_str)
+
+
+def get_data(pattern, selector='value',
+             where_clause=None,
+             group_by=None,
+             fill_empty=None,
+             time_delta=settings.INFLUXDB_FROM,
+             limit=settings.INFLUXDB_LIMIT,
+             fetchall=False,
+             since=None,
+             stream=False):
+    '''
+    Query a metric and its data from influxdb.
+    Return the value in a graphite compatible format
+
+    * selector - can be specified as
+                 'value'
+                 'mean(value)'
+                 'percentile(value, 95)'
+
+    * group_by - can be specified as
+                 'time(10s)'
+                 'time(60m), host'
+
+    * fill_empty - can be Null, or an integer value
+
+    * since - a unix timestamp to fetch only the points after, in place of
+              those of the last time_delta minutes
+
+    * stream - when the result isn't cached, return the series as they're
+               decoded from the response, in a generator that can be read
+               only once
+    '''
     if fetchall:
         pattern = '.*%s.*' % (pattern)
 
-    query = 'select %s from /%s/ %s %s %s %s order asc' % \
-        (selector, pattern, group_by, fill_str, where_str, limit_str)
+    query = _build_query(pattern, selector, where_clause, group_by,
+                         fill_empty, time_delta, limit, since)
+    logging.debug('Make influxdb query %s' % query)
 
+    if since is not None:
+        # Only the check that asked wants exactly these points
+        return _run_query(query)
+    if stream and settings.METRIC_CACHE_TTL <= 0:
+        return _run_query(query, stream=True)
+    return metric_cache.get_or_fetch(query, lambda: _run_query(query))
 
-    logging.debug('Make influxdb query %s' % query)
 
+def _run_query(query, stream=False):
     client = _get_influxdb_client()
+    if _is_v1():
+        series = _convert_series(client.query_series(query))
+        return series if stream else list(series)
+
     resp = client.query(query, chunked=True)
 
     return _convert_influx_to_graphite(resp)
 
 
+def _convert_series(series_iter):
+    '''
+    Converts InfluxDB 1.x series into graphite compatible output as they
+    arrive. Series grouped by tags are named after the tag values, like
+    'cpu.web1'.
+    '''
+    for series in series_iter:
+        columns = series['columns']
+        time_index = columns.index('time') if 'time' in columns else 0
+        value_index = 1 if time_index == 0 else 0
+        name = series['name']
+        tags = series.get('tags')
+        if tags:
+            name = '.'.join([name] + [tags[key] for key in sorted(tags)])
+        yield dict(target=name,
+                   datapoints=[(row[value_index], row[time_index])
+                               for row in series['values']])
+
+
 def _convert_influx_to_graphite(resp):
     """
     Convert the result from an influx query into a graphite compatible output
@@ -121,24 +190,140 @@ def _convert_influx_to_graphite(resp):
             for key, value in data.iteritems()]
 
 
-def get_matching_metrics(pattern):
+def can_aggregate(selector, group_by):
     '''
-    Given a pattern, find all matching metrics for it
+    True if InfluxDB can summarize each series of the query itself: the
+    selector is a plain field, the series aren't split into time buckets
+    and the server is 1.x, which can limit the points each series'
+    aggregates cover with a subquery
     '''
-    query = 'list series /.*%s.*/' % (pattern)
+    return (_is_v1() and re.match(r'^\w+$', selector or '') is not None and
+            'time(' not in (group_by or '').replace(' ', ''))
+
+
+def get_aggregates(pattern, selector='value',
+                   where_clause=None,
+                   group_by=None,
+                   time_delta=settings.INFLUXDB_FROM):
+    '''
+    The max, min, mean and count of the selected field of each series over
+    its last time_delta points in the last time_delta minutes, the same
+    points `parse_metric` summarizes when it fetches them, computed by
+    InfluxDB 1.x. Returns a list of dicts of target, time and each
+    aggregate.
+    '''
+    aggregates = ', '.join('%s(%s)' % (aggregate, selector)
+                           for aggregate in AGGREGATES)
+    latest = _build_query(pattern, selector, where_clause, group_by,
+                          None, time_delta, None, None)
+    if group_by:
+        group_by = 'group by %s' % group_by
+    query = 'select %s from (%s order by time desc limit %d) ' \
+        'where time > now() - %dm %s' % \
+        (aggregates, latest, time_delta, time_delta, group_by or '')
     logging.debug('Make influxdb query %s' % query)
 
+    return metric_cache.get_or_fetch(
+        query, lambda: list(_run_aggregate_query(query)))
+
+
+def _run_aggregate_query(query):
+    for series in _get_influxdb_client().query_series(query):
+        for row in series['values']:
+            yield _aggregate_row(series['name'], series.get('tags'),
+                                 series['columns'], row)
+
+
+def _aggregate_row(name, tags, columns, row):
+    record = dict(zip(columns, row))
+    groups = [tags[key] for key in sorted(tags or ())]
+    aggregate = dict((key, record.get(key)) for key in AGGREGATES)
+    aggregate['target'] = '.'.join([name] + groups)
+    aggregate['time'] = record.get('time')
+    return aggregate
+
+
+def _summarize_aggregates(aggregates):
+    '''
+    The summary `metric_summary.summarize` gives of the points, from the
+    aggregates of each series
+    '''
+    ret = {
+        'num_series_with_data': 0,
+        'num_series_no_data': 0,
+        'series_counts': [],
+    }
+    count = 0
+    total = 0.0
+    lowest = highest = None
+    for aggregate in aggregates:
+        ret['series_counts'].append((aggregate['target'],
+                                     aggregate['count'] or 0))
+        if not aggregate['count']:
+            ret['num_series_no_data'] += 1
+            continue
+        ret['num_series_with_data'] += 1
+        count += aggregate['count']
+        total += aggregate['mean'] * aggregate['count']
+        series_min = float(aggregate['min'])
+        series_max = float(aggregate['max'])
+        if lowest is None or series_min < lowest:
+            lowest = series_min
+        if highest is None or series_max > highest:
+            highest = series_max
+    ret['num_values'] = count
+    if count:
+        ret['max'] = highest
+        ret['min'] = lowest
+        ret['average_value'] = total / count
+    return ret
+
+
+def _series_names(pattern=None):
+    '''
+    Names of the series (measurements, in 1.x) matching the regex pattern,
+    or of all of them
+    '''
     client = _get_influxdb_client()
+    if _is_v1():
+        query = 'show measurements'
+        if pattern is not None:
+            query += ' with measurement =~ /%s/' % (pattern)
+        logging.debug('Make influxdb query %s' % query)
+        return [row[0]
+                for series in client.query_series(query)
+                for row in series['values']]
+
+    if pattern is not None:
+        query = 'list series /%s/' % (pattern)
+    else:
+        query = 'list series'
+    logging.debug('Make influxdb query %s' % query)
     resp = client.query(query, chunked=True)
+    if not resp:
+        return []
+    return [point[1] for point in resp[0]['points']]
+
+
+def get_matching_metrics(pattern):
+    '''
+    Given a pattern, find all matching metrics for it
+    '''
     metrics = []
 
-    for point in resp[0]['points']:
-        series = point[1]
+    for series in _series_names('.*%s.*' % (pattern)):
         metrics.append(dict(is_leaf=1, name=series, path=series))
 
     return dict(metrics=metrics)
 
 
+def list_series():
+    '''
+    Names of every series in the database
+    '''
+    return _series_names()
+
+
 def get_all_metrics(limit=None):
     '''
     Grabs all metrics by navigating find API recursively
@@ -160,30 +345,77 @@ def parse_metric(metric,
                  group_by=None,
                  fill_empty=None,
                  where_clause=None,
-                 time_delta=settings.INFLUXDB_FROM):
+                 time_delta=settings.INFLUXDB_FROM,
+                 keep_values=False,
+                 incremental=False,
+                 aggregate=False,
+                 raw_points=None):
     '''
     Returns dict with:
     - num_series_with_data: Number of series with data
     - num_series_no_data: Number of total series
+    - num_values
     - max
     - min
     - average_value
+    - all_values, if keep_values is set
+    - series_counts, the number of values of each series, as a list of
+      (target, count)
+    - raw, the series, up to raw_points points of them if given
+
+    With incremental set, only points newer than those fetched for the
+    same query the last time are fetched, and merged into those.
+
+    With aggregate set, and a query InfluxDB can summarize itself, only the
+    max, min, mean and count of the same points of each series are
+    fetched, and raw has the mean of each series.
     '''
     ret = {
         'num_series_with_data': 0,
         'num_series_no_data': 0,
+        'series_counts': [],
         'error': None,
         'all_values': [],
         'raw': ''
     }
-    try:
-        data = get_data(metric,
+
+    def fetch(since=None, stream=False):
+        return get_data(metric,
                         selector=selector,
                         group_by=group_by,
                         fill_empty=fill_empty,
                         where_clause=where_clause,
                         time_delta=time_delta,
-                        limit=None)
+                        limit=None,
+                        since=since,
+                        stream=stream)
+
+    aggregate = (aggregate and time_delta is not None and
+                 can_aggregate(selector, group_by))
+    try:
+        if aggregate:
+            data = get_aggregates(metric,
+                                  selector=selector,
+                                  where_clause=where_clause,
+                                  group_by=group_by,
+                                  time_delta=time_delta)
+        elif incremental and time_delta is not None:
+            key = repr((metric, selector, group_by, fill_empty,
+                        where_clause, time_delta))
+            data = metric_window.get_window(key, time_delta, fetch)
+        else:
+            # Summarized as the series are decoded, when they aren't cached
+            data = fetch(stream=True)
+
+        if aggregate:
+            summary = _summarize_aggregates(data)
+            summary['raw'] = [dict(target=row['target'],
+                                   datapoints=[(row['mean'], row['time'])])
+                              for row in data]
+        else:
+            # Errors in a streamed response only show up here
+            summary = metric_summary.summarize(data, time_delta, keep_values,
+                                               raw_points)
 
     except Exception, exp:
         ret['error'] = 'Error getting data from InfluxDB: %s' % exp
@@ -191,21 +423,7 @@ def parse_metric(metric,
         logging.exception('Error getting data from InfluxDB: %s' % exp)
         return ret
 
-    all_values = []
-    for target in data:
-        values = [float(t[0])
-                  for t in target['datapoints'][-time_delta:]
-                  if t[0] is not None]
-        if values:
-            ret['num_series_with_data'] += 1
-        else:
-            ret['num_series_no_data'] += 1
-        all_values.extend(values)
-    if all_values:
-        ret['max'] = max(all_values)
-        ret['min'] = min(all_values)
-        ret['average_value'] = sum(all_values) / len(all_values)
-    ret['all_values'] = all_values
-    ret['raw'] = data
+    ret = summary
+    ret['error'] = None
 
     return ret
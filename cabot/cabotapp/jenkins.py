@@ -1,11 +1,12 @@
 from os import environ as env
 
 from django.conf import settings
-import requests
 from datetime import datetime
 from django.utils import timezone
 from celery.utils.log import get_task_logger
 
+from . import http_pool, metric_cache
+
 logger = get_task_logger(__name__)
 
 if settings.JENKINS_USER:
@@ -13,21 +14,19 @@ if settings.JENKINS_USER:
 else:
     auth = None
 
+# Only the fields of each job that the checks look at
+JOBS_TREE = ('jobs[name,color,lastBuild[number],'
+             'queueItem[blocked,inQueueSince]]')
 
-def get_job_status(jobname):
+
+def _job_status(status, status_code=200):
     ret = {
         'active': True,
         'succeeded': False,
         'blocked_build_time': None,
-        'status_code': 200
+        'status_code': status_code
     }
-    endpoint = settings.JENKINS_API + 'job/%s/api/json' % jobname
-
-    resp = requests.get(endpoint, auth=auth, verify=True)
-    resp.raise_for_status()
-    status = resp.json()
-    ret['status_code'] = resp.status_code
-    ret['job_number'] = status['lastBuild'].get('number', None)
+    ret['job_number'] = (status['lastBuild'] or {}).get('number', None)
     if status['color'].startswith('blue'):
         ret['active'] = True
         ret['succeeded'] = True
@@ -39,3 +38,88 @@ def get_job_status(jobname):
             float(status['queueItem']['inQueueSince']) / 1000).replace(tzinfo=timezone.utc)
         ret['blocked_build_time'] = (timezone.now() - time_blocked_since).total_seconds()
     return ret
+
+
+def _folder_path(folder):
+    return ''.join('job/%s/' % part for part in folder.split('/') if part)
+
+
+def get_jobs(folder=''):
+    """
+    The name, color, last build number and queue item of every job in
+    `folder` ('' for the top level, 'a/b' for nested folders), as a dict
+    of job name -> job. Fetched with a single tree-filtered request and
+    shared by every caller for JENKINS_BULK_CACHE_TTL seconds.
+    """
+    endpoint = settings.JENKINS_API + _folder_path(folder) + 'api/json'
+
+    def fetch():
+        resp = http_pool.get(endpoint, auth=auth, verify=True,
+                             params={'tree': JOBS_TREE})
+        resp.raise_for_status()
+        return dict((job['name'], job) for job in resp.json()['jobs'])
+
+    return metric_cache.get_or_fetch('jenkins-jobs:%s' % endpoint, fetch,
+                                     settings.JENKINS_BULK_CACHE_TTL)
+
+
+def get_job_status(jobname):
+    if settings.JENKINS_BULK_STATUS:
+        folder, _, name = jobname.rpartition('/')
+        job = get_jobs(folder).get(name)
+        if job is None:
+            return {
+                'active': False,
+                'succeeded': False,
+                'blocked_build_time': None,
+                'job_number': None,
+                'status_code': 404
+            }
+        return _job_status(job)
+
+    endpoint = settings.JENKINS_API + 'job/%s/api/json' % jobname
+
+    resp = http_pool.get(endpoint, auth=auth, verify=True)
+    resp.raise_for_status()
+    return _job_status(resp.json(), resp.status_code)
+
+
+# The Notification plugin sends both COMPLETED and FINALIZED, in separate
+# requests, once a build has a result. Only FINALIZED, the last message for
+# a build, is acted on, so each build is only counted once.
+FINISHED_PHASE = 'FINALIZED'
+PASSING_RESULTS = ('SUCCESS',)
+
+
+def _job_name(notification):
+    """
+    The job's full name, with the folders it's in, from its URL
+    ('job/team/job/deploy/' -> 'team/deploy')
+    """
+    parts = (notification.get('url') or '').strip('/').split('/')
+    if len(parts) > 1 and parts[0] == 'job':
+        return '/'.join(parts[1::2])
+    return notification['name']
+
+
+def parse_notification(notification):
+    """
+    (job name, build number, whether it succeeded) for a Notification
+    plugin message about a finished build, or None for other messages
+    """
+    build = notification.get('build') or {}
+    if build.get('phase') != FINISHED_PHASE or not build.get('status'):
+        return None
+    return (_job_name(notification), int(build['number']),
+            build['status'] in PASSING_RESULTS)
+
+
+def build_status(number, succeeded):
+    """A build status dict, as from `get_job_status`, for a finished build"""
+    return {
+        'active': True,
+        'succeeded': succeeded,
+        'blocked_build_time': None,
+        'job_number': number,
+        'status_code': 200
+    }
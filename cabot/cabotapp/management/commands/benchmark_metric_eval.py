@@ -0,0 +1,207 @@
+import logging
+import random
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from cabot.cabotapp import metric_eval
+
+# The old loop's messages are still formatted, but never written out, so
+# the times leave out the cost of the log output itself
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.WARNING)
+
+
+def reference_check(series, check_type, threshold, expected_num_metrics,
+                    reference_point):
+    """
+    The point-by-point evaluation metric checks used to run, logging and
+    all, kept to time and check `metric_eval` against. Returns `(failed,
+    failure_value, failed_metric_name, matched_metrics)`.
+    """
+    failed = None
+    failure_value = 0
+    failed_metric_name = None
+    matched_metrics = 0
+    if series['num_series_with_data'] > 0:
+        if check_type == '<':
+            failed = not float(series['min']) < float(threshold)
+            if failed:
+                failure_value = series['min']
+        elif check_type == '<=':
+            failed = not float(series['min']) <= float(threshold)
+            if failed:
+                failure_value = series['min']
+        elif check_type == '>':
+            failed = not float(series['max']) > float(threshold)
+            if failed:
+                failure_value = series['max']
+        elif check_type == '>=':
+            failed = not float(series['max']) >= float(threshold)
+            if failed:
+                failure_value = series['max']
+        elif check_type == '==':
+            failed = not float(threshold) in series['all_values']
+            if failed:
+                failure_value = float(threshold)
+        else:
+            raise Exception(u'Check type %s not supported' % check_type)
+    if expected_num_metrics > 0:
+        json_series = series['raw']
+        logger.info("Processing series " + str(json_series))
+        for line in json_series:
+            matched_metrics = 0
+            metric_failed = True
+            for point in line['datapoints']:
+                last_value = point[0]
+                time_stamp = point[1]
+                if time_stamp <= reference_point:
+                    logger.debug('Point %s is older than ref ts %d' %
+                                 (str(point), reference_point))
+                    continue
+                if last_value is not None:
+                    if check_type == '<':
+                        metric_failed = not last_value < float(threshold)
+                    elif check_type == '<=':
+                        metric_failed = not last_value <= float(threshold)
+                    elif check_type == '>':
+                        metric_failed = not last_value > float(threshold)
+                    elif check_type == '>=':
+                        metric_failed = not last_value >= float(threshold)
+                    elif check_type == '==':
+                        metric_failed = not last_value == float(threshold)
+                    else:
+                        raise Exception(u'Check type %s not supported' %
+                                        check_type)
+                    if metric_failed:
+                        failure_value = last_value
+                        failed_metric_name = line['target']
+                    else:
+                        matched_metrics += 1
+                        logger.info("Metrics matched: " + str(matched_metrics))
+                        logger.info("Required metrics: " + str(expected_num_metrics))
+                else:
+                    failed = True
+            logger.info("Processing series ...")
+            if matched_metrics < expected_num_metrics:
+                failed = True
+                failure_value = None
+                failed_metric_name = line['target']
+                break
+            else:
+                failed = False
+    return failed, failure_value, failed_metric_name, matched_metrics
+
+
+def vectorized_check(series, check_type, threshold, expected_num_metrics,
+                     reference_point):
+    """`reference_check` using `metric_eval`"""
+    value = float(threshold)
+    failed = None
+    failure_value = 0
+    failed_metric_name = None
+    matched_metrics = 0
+    if series['num_series_with_data'] > 0:
+        failed, failure_value = metric_eval.check_aggregates(
+            series, check_type, value)
+    if expected_num_metrics > 0:
+        failed, failure_value, failed_metric_name, matched_metrics = \
+            metric_eval.check_series(series['raw'], check_type, value,
+                                     expected_num_metrics, reference_point,
+                                     failed, failure_value)
+    return failed, failure_value, failed_metric_name, matched_metrics
+
+
+def make_series(num_series, num_points, step=10, missing=0.01, now=None,
+                rand=random):
+    """
+    Series shaped like the output of `parse_metric`: `num_series` series
+    of `num_points` points, `step` seconds apart and ending at `now`, with
+    a `missing` fraction of None values.
+    """
+    now = int(now or time.time())
+    raw = []
+    all_values = []
+    with_data = 0
+    for n in range(num_series):
+        datapoints = []
+        for i in range(num_points):
+            if rand.random() < missing:
+                point_value = None
+            else:
+                point_value = round(rand.uniform(0, 100), 1)
+                all_values.append(point_value)
+            datapoints.append([point_value, now - (num_points - i) * step])
+        if any(p[0] is not None for p in datapoints):
+            with_data += 1
+        raw.append({'target': 'host%d.load' % n, 'datapoints': datapoints})
+    series = {
+        'num_series_with_data': with_data,
+        'all_values': all_values,
+        'raw': raw,
+    }
+    if all_values:
+        series['min'] = min(all_values)
+        series['max'] = max(all_values)
+        series['average_value'] = sum(all_values) / len(all_values)
+    return series
+
+
+def _best_of(runs, func, *args):
+    best = None
+    for _ in range(runs):
+        started = time.time()
+        func(*args)
+        elapsed = time.time() - started
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+class Command(BaseCommand):
+    help = ('Times metric check threshold evaluation over synthetic series, '
+            'point by point against vectorized, and checks they agree.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--series',
+                    dest='series',
+                    type='int',
+                    default=500,
+                    help='Number of series (default: 500)'),
+        make_option('--points',
+                    dest='points',
+                    type='int',
+                    default=360,
+                    help='Points per series (default: 360, an hour at 10s)'),
+        make_option('--runs',
+                    dest='runs',
+                    type='int',
+                    default=5,
+                    help='Runs to take the best time of (default: 5)'),
+    )
+
+    def handle(self, *args, **options):
+        series = make_series(options['series'], options['points'],
+                             rand=random.Random(0))
+        reference_point = time.time() - 7 * 60
+        cases = [('<', '150', 1), ('>', '-1', 1), ('>=', '50', 1),
+                 ('<=', '100', 5), ('==', '42', 0)]
+        total_reference = total_vectorized = 0
+        for check_type, value, expected in cases:
+            args = (series, check_type, value, expected, reference_point)
+            if reference_check(*args) != vectorized_check(*args):
+                raise CommandError('Results differ for %s %s' %
+                                   (check_type, value))
+            reference = _best_of(options['runs'], reference_check, *args)
+            vectorized = _best_of(options['runs'], vectorized_check, *args)
+            total_reference += reference
+            total_vectorized += vectorized
+            self.stdout.write('%-2s %6s  point by point %8.2f ms  '
+                              'vectorized %8.2f ms  %5.1fx' % (
+                                  check_type, value, reference * 1000,
+                                  vectorized * 1000,
+                                  reference / max(vectorized, 1e-9)))
+        self.stdout.write('%d series x %d points: %.1fx faster overall' % (
+            options['series'], options['points'],
+            total_reference / max(total_vectorized, 1e-9)))
@@ -0,0 +1,50 @@
+import os
+import socket
+import time
+import logging
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cabot.cabotapp.models import SchedulerNode
+from cabot.cabotapp.tasks import dispatch_shard
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = ('Runs a check scheduler node. Every node dispatches its own '
+            'shard of the due checks; run several against the same '
+            'database with CHECK_SCHEDULER_SHARDED=true.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--name',
+                    dest='name',
+                    default=None,
+                    help='Unique node name (default: hostname:pid)'),
+        make_option('--once',
+                    action='store_true',
+                    dest='once',
+                    default=False,
+                    help='Run a single tick and exit'),
+    )
+
+    def handle(self, *args, **options):
+        name = options['name'] or '%s:%s' % (socket.gethostname(),
+                                             os.getpid())
+        interval = settings.RUN_ALL_CHECKS_INTERVAL
+        logger.info('Starting scheduler node %s' % name)
+        try:
+            while True:
+                started = time.time()
+                try:
+                    dispatch_shard(name)
+                except Exception:
+                    logger.exception('Error dispatching checks')
+                if options['once']:
+                    break
+                time.sleep(max(0, interval - (time.time() - started)))
+        finally:
+            # Hand our shard over straight away rather than on timeout
+            SchedulerNode.objects.filter(name=name).delete()
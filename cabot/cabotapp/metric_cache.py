@@ -0,0 +1,94 @@
+"""
+Short-lived cache of metric query results shared by the checks.
+
+Many checks run the same query with different thresholds. Results are kept
+for METRIC_CACHE_TTL seconds in the 'metrics' cache, which by default is a
+file-based cache that every worker on a host shares. Only one caller runs
+a given query at a time: threads and greenlets in a worker wait on a local
+lock, and other workers wait on a lock key added to the shared cache (which
+is atomic on memcached, and best effort on the file-based cache).
+"""
+from __future__ import absolute_import
+
+import hashlib
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import get_cache
+
+cache = get_cache('metrics')
+
+# Seconds to wait for another worker to finish running a query before
+# running it ourselves
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.05
+
+_locks = defaultdict(threading.Lock)
+_locks_lock = threading.Lock()
+_counters = {'hits': 0, 'misses': 0}
+
+
+def normalize(query):
+    """Collapse whitespace so equivalent queries share a cache entry"""
+    return ' '.join(query.split())
+
+
+def _key(query):
+    return 'metric:%s' % hashlib.md5(normalize(query)).hexdigest()
+
+
+def _local_lock(key):
+    with _locks_lock:
+        return _locks[key]
+
+
+def _count(counter):
+    with _locks_lock:
+        _counters[counter] += 1
+
+
+def get_or_fetch(query, fetch, ttl=None):
+    """
+    The cached result of `query`, or the result of calling `fetch`, which
+    is then cached for `ttl` seconds (METRIC_CACHE_TTL by default).
+    Concurrent callers share a single call to `fetch`.
+    """
+    if ttl is None:
+        ttl = settings.METRIC_CACHE_TTL
+    if ttl <= 0:
+        return fetch()
+    key = _key(query)
+    value = cache.get(key)
+    if value is not None:
+        _count('hits')
+        return value
+    with _local_lock(key):
+        value = cache.get(key)
+        if value is not None:
+            _count('hits')
+            return value
+        lock_key = '%s:lock' % key
+        deadline = time.time() + LOCK_TIMEOUT
+        while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key)
+            if value is not None:
+                _count('hits')
+                return value
+            if time.time() > deadline:
+                break
+        try:
+            _count('misses')
+            value = fetch()
+            cache.set(key, value, ttl)
+        finally:
+            cache.delete(lock_key)
+    return value
+
+
+def stats():
+    """Cache hits and misses in this process"""
+    with _locks_lock:
+        return dict(_counters)
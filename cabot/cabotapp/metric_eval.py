@@ -0,0 +1,105 @@
+"""
+Threshold evaluation for metric checks over NumPy arrays.
+
+A metric check compares every recent point of every series it matched
+against its threshold. Walking those points one at a time in Python costs
+seconds of CPU on checks that match hundreds of hosts at fine resolution,
+so the points of all the series are laid out in arrays once and compared
+in a few operations. Results are exactly those of comparing the points one
+by one, in order.
+"""
+from __future__ import absolute_import
+
+from itertools import chain, imap
+from operator import itemgetter
+
+import numpy as np
+
+COMPARATORS = {
+    '<': np.less,
+    '<=': np.less_equal,
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '==': np.equal,
+}
+
+_timestamp = itemgetter(1)
+
+
+def comparator(check_type):
+    """The ufunc that is True where a value passes `check_type`"""
+    try:
+        return COMPARATORS[check_type]
+    except KeyError:
+        raise Exception(u'Check type %s not supported' % check_type)
+
+
+def check_aggregates(series, check_type, value):
+    """
+    Compares the aggregates from `parse_metric` against the threshold
+    `value`. Returns `(failed, failure_value)`.
+    """
+    compare = comparator(check_type)
+    if check_type == '==':
+        # A scan of the list already runs in C and stops at the first
+        # match, which beats copying it into an array first
+        if value in series['all_values']:
+            return False, 0
+        return True, value
+    if check_type in ('<', '<='):
+        failure_value = series['min']
+    else:
+        failure_value = series['max']
+    if compare(float(failure_value), value):
+        return False, 0
+    return True, failure_value
+
+
+def check_series(lines, check_type, value, expected_num_metrics,
+                 reference_point, failed, failure_value):
+    """
+    Checks that every series in `lines` has at least
+    `expected_num_metrics` points newer than `reference_point` that pass
+    the threshold `value`, stopping at the first series that doesn't.
+
+    `failed` and `failure_value` carry the result of the aggregate checks.
+    Returns `(failed, failure_value, failed_metric_name, matched_metrics)`,
+    where `failure_value` is the last failing point seen, or None when a
+    series has too few passing points, and `matched_metrics` is the count
+    for the last series checked.
+    """
+    compare = comparator(check_type)
+    if not lines:
+        return failed, failure_value, None, 0
+    points = list(chain.from_iterable(line['datapoints'] for line in lines))
+    ends = np.cumsum([len(line['datapoints']) for line in lines])
+    times = np.fromiter(imap(_timestamp, points), float, len(points))
+    # Indexes into `points` of the recent ones, then the series of each
+    recent = np.flatnonzero(times > reference_point)
+    values = np.array([points[i][0] for i in recent], dtype=float)
+    present = ~np.isnan(values)
+    if not present.all():
+        # None became NaN, so only now tell missing points from real NaNs
+        present = np.array([points[i][0] is not None for i in recent],
+                           dtype=bool)
+        recent = recent[present]
+        values = values[present]
+    series = np.searchsorted(ends, recent, side='right')
+    with np.errstate(invalid='ignore'):
+        passed = compare(values, value)
+    matched = np.bincount(series[passed], minlength=len(lines))
+
+    short = np.flatnonzero(matched < expected_num_metrics)
+    if len(short):
+        first = short[0]
+        return True, None, lines[first]['target'], int(matched[first])
+
+    # Missing points don't fail series that have enough passing ones
+    failed_metric_name = None
+    failing = np.flatnonzero(~passed)
+    if len(failing):
+        last = failing[-1]
+        # Report the original point, not its float64 copy
+        failure_value = points[recent[last]][0]
+        failed_metric_name = lines[series[last]]['target']
+    return False, failure_value, failed_metric_name, int(matched[-1])
@@ -0,0 +1,236 @@
+"""
+Index of metric names for the check form's autocomplete.
+
+Rather than asking the metrics backend on every keystroke, names are kept
+in a trie of their dot-separated parts, which answers prefix and Graphite
+glob lookups by walking only the branches that can match. A periodic task
+lists the series from InfluxDB and stores the names in the database, which
+the web and worker processes share wherever they run. Each process keeps
+its own trie, checks at most every CHECK_INTERVAL seconds whether the
+stored names have changed, and applies only the names added or removed
+since it last looked, so unchanged branches are left as they are.
+"""
+from __future__ import absolute_import
+
+import logging
+import re
+import threading
+import time
+
+
+from django.db.models import Count, Max
+
+from . import influx
+from .graphite import _glob_regex
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for changes to the stored names
+CHECK_INTERVAL = 30
+
+# Marks a node that is also the end of a name
+LEAF = None
+
+# Searches with Python's backtracking regex engine can run for ever on a
+# repeated group or a backreference, or take long on very long patterns,
+# so those are left to InfluxDB, whose regexes run in linear time
+MAX_PATTERN_LENGTH = 200
+_BACKTRACKING = re.compile(r'\)[*+{]|\\[1-9]|\(\?P=')
+
+
+class MetricTrie(object):
+    """Trie of dot-separated metric names"""
+
+    def __init__(self, names=()):
+        self.root = {}
+        self.names = set()
+        self._sorted = []
+        self.update(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        if name in self.names:
+            return
+        node = self.root
+        for part in name.split('.'):
+            node = node.setdefault(part, {})
+        node[LEAF] = True
+        self.names.add(name)
+
+    def discard(self, name):
+        if name not in self.names:
+            return
+        path = [self.root]
+        parts = name.split('.')
+        for part in parts:
+            path.append(path[-1][part])
+        del path[-1][LEAF]
+        # Prune the branches left empty
+        for node, part in reversed(zip(path[:-1], parts)):
+            if node[part]:
+                break
+            del node[part]
+        self.names.discard(name)
+
+    def update(self, names):
+        """
+        Makes the trie hold exactly `names`, touching only the branches of
+        names added or removed. Returns the numbers added and removed.
+        """
+        names = set(names)
+        added = names - self.names
+        removed = self.names - names
+        for name in removed:
+            self.discard(name)
+        for name in added:
+            self.add(name)
+        if added or removed:
+            # Replaced rather than changed, so searches already running
+            # carry on over the old list
+            self._sorted = sorted(self.names)
+        return len(added), len(removed)
+
+    def _walk(self, node, prefix):
+        if LEAF in node:
+            yield prefix
+        for part, child in node.iteritems():
+            if part is not LEAF:
+                for name in self._walk(child, '%s.%s' % (prefix, part)):
+                    yield name
+
+    def prefix(self, prefix):
+        """Sorted names starting with `prefix`"""
+        parts = prefix.split('.')
+        node = self.root
+        path = []
+        for part in parts[:-1]:
+            node = node.get(part)
+            if node is None:
+                return []
+            path.append(part)
+        names = []
+        base = '.'.join(path)
+        for part, child in node.iteritems():
+            if part is not LEAF and part.startswith(parts[-1]):
+                full = '%s.%s' % (base, part) if base else part
+                names.extend(self._walk(child, full))
+        return sorted(names)
+
+    def glob(self, pattern):
+        """Sorted names matched by the Graphite path `pattern`"""
+        nodes = [(self.root, '')]
+        for part in pattern.split('.'):
+            regex = _glob_regex(part)
+            matched = []
+            for node, path in nodes:
+                for name, child in node.iteritems():
+                    if name is not LEAF and (name == part or
+                                             regex.match(name)):
+                        full = '%s.%s' % (path, name) if path else name
+                        matched.append((child, full))
+            nodes = matched
+        return sorted(path for node, path in nodes if LEAF in node)
+
+    def search(self, regex):
+        """
+        Sorted names the regex matches anywhere in, like InfluxDB's
+        `list series /.*regex.*/`
+        """
+        compiled = re.compile(regex)
+        return [name for name in self.candidates(regex)
+                if compiled.search(name)]
+
+    def candidates(self, regex):
+        """
+        Sorted names the regex could match: those under the branch of an
+        anchored literal prefix, or else all of them
+        """
+        literal = re.match(r'\^((?:[\w-]|\\\.)+)', regex)
+        if literal and '|' not in regex:
+            prefix = literal.group(1).replace('\\.', '.')
+            if regex[literal.end():literal.end() + 1] in ('?', '*', '{'):
+                # The last character is optional
+                prefix = prefix[:-1]
+            return self.prefix(prefix)
+        return self._sorted
+
+
+_local = {'trie': None, 'version': None, 'checked': None}
+_lock = threading.Lock()
+
+
+def _stored_version():
+    """Changes whenever names are added to or removed from the database"""
+    from .models import MetricName
+    stored = MetricName.objects.aggregate(Max('id'), Count('id'))
+    return stored['id__max'], stored['id__count']
+
+
+def refresh():
+    """
+    Lists every series from InfluxDB into the stored index. Returns the
+    numbers of names added and removed.
+    """
+    from .models import MetricName
+    names = set(influx.list_series())
+    stored = dict((name, pk) for pk, name in
+                  MetricName.objects.values_list('id', 'name').iterator())
+    added = names - set(stored)
+    removed = set(stored) - names
+    if removed:
+        removed_ids = [stored[name] for name in removed]
+        for offset in range(0, len(removed_ids), 500):
+            MetricName.objects.filter(
+                id__in=removed_ids[offset:offset + 500]).delete()
+    MetricName.objects.bulk_create(
+        [MetricName(name=name) for name in added], batch_size=500)
+    logger.info('Metric index refreshed: %d names, %d added, %d removed' %
+                (len(names), len(added), len(removed)))
+    return len(added), len(removed)
+
+
+def get_index():
+    """
+    This process's trie, brought up to date with the stored index, or None
+    if the index hasn't been built yet
+    """
+    from .models import MetricName
+    with _lock:
+        now = time.time()
+        if _local['checked'] is not None and \
+                now - _local['checked'] < CHECK_INTERVAL:
+            return _local['trie']
+        _local['checked'] = now
+        version = _stored_version()
+        if version != _local['version']:
+            names = MetricName.objects.values_list('name', flat=True)
+            if _local['trie'] is not None:
+                # Emptied too, once every name has been removed
+                _local['trie'].update(names.iterator())
+            elif version[1]:
+                _local['trie'] = MetricTrie(names.iterator())
+            _local['version'] = version
+        return _local['trie']
+
+
+def get_matching_metrics(pattern):
+    """
+    `influx.get_matching_metrics`, answered from the index once it's built.
+    Nothing matches a pattern that isn't a valid regex.
+    """
+    try:
+        compiled = re.compile(pattern)
+    except re.error:
+        return dict(metrics=[])
+    trie = get_index()
+    if trie is None or len(pattern) > MAX_PATTERN_LENGTH or \
+            _BACKTRACKING.search(pattern):
+        return influx.get_matching_metrics(pattern)
+    with _lock:
+        candidates = trie.candidates(pattern)
+    # Matched outside the lock, as the list isn't changed once made
+    names = [name for name in candidates if compiled.search(name)]
+    return dict(metrics=[dict(is_leaf=1, name=name, path=name)
+                         for name in names])
@@ -0,0 +1,71 @@
+"""
+One-pass summaries of metric series.
+
+`parse_metric` reports how many series have data and the count, min, max
+and mean of their latest values. These are folded in series by series as
+the series arrive, which may be straight from the response being decoded,
+so only one series' values are held at a time. The full list of values is
+kept only when asked for, as `==` checks need it, and the series
+themselves only up to the number of points the caller has room for.
+"""
+from __future__ import absolute_import
+
+
+def summarize(data, last_points, keep_values=False, raw_points=None):
+    """
+    Summary of the last `last_points` values of every series in `data`,
+    which can be any iterable and is only read once:
+    - num_series_with_data
+    - num_series_no_data
+    - num_values
+    - series_counts, the number of values of each series, as a list of
+      (target, count)
+    - max, min and average_value, if there are any values
+    - all_values, if `keep_values` is set
+    - raw, the series, as long as they have no more than `raw_points`
+      points between them (all of them if None, none if 0)
+    """
+    ret = {
+        'num_series_with_data': 0,
+        'num_series_no_data': 0,
+        'series_counts': [],
+        'raw': [],
+    }
+    count = 0
+    total = 0
+    lowest = highest = None
+    all_values = [] if keep_values else None
+    kept_points = 0
+    for target in data:
+        if raw_points is None or \
+                kept_points + len(target['datapoints']) <= raw_points:
+            ret['raw'].append(target)
+            kept_points += len(target['datapoints'])
+        values = [float(t[0])
+                  for t in target['datapoints'][-last_points:]
+                  if t[0] is not None]
+        ret['series_counts'].append((target['target'], len(values)))
+        if not values:
+            ret['num_series_no_data'] += 1
+            continue
+        ret['num_series_with_data'] += 1
+        count += len(values)
+        # Carrying the total over adds the values in the same order as one
+        # sum over all of them, so the mean comes out exactly the same
+        total = sum(values, total)
+        series_min = min(values)
+        series_max = max(values)
+        if lowest is None or series_min < lowest:
+            lowest = series_min
+        if highest is None or series_max > highest:
+            highest = series_max
+        if keep_values:
+            all_values.extend(values)
+    ret['num_values'] = count
+    if count:
+        ret['max'] = highest
+        ret['min'] = lowest
+        ret['average_value'] = total / count
+    if keep_values:
+        ret['all_values'] = all_values
+    return ret
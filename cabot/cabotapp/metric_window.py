@@ -0,0 +1,102 @@
+"""
+Rolling windows of metric points kept between check runs.
+
+A metric check looks at the last few minutes of its series every run, but
+most of those points were already fetched by the run before. The window
+from the last run is kept in the 'metrics' cache, shared by every worker
+on the host, and the next run only fetches points newer than the newest
+one it holds, less METRIC_WINDOW_OVERLAP seconds for points that were
+still being written (or time buckets still filling). Those are merged
+into the window and points that have aged out are dropped. When there's
+no window, or it's too old to join up with the new points, the whole
+window is fetched again.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+
+from .metric_cache import cache
+
+_lock = threading.Lock()
+_counters = {'full': 0, 'incremental': 0}
+
+
+def _count(counter):
+    with _lock:
+        _counters[counter] += 1
+
+
+def _newest(data):
+    newest = None
+    for target in data:
+        if target['datapoints']:
+            last = max(t[1] for t in target['datapoints'])
+            if newest is None or last > newest:
+                newest = last
+    return newest
+
+
+def merge(data, update, since, oldest):
+    """
+    Series in `data` with their points after `since` replaced by those in
+    `update`, dropping points no newer than `oldest` and series left with
+    no points
+    """
+    merged = []
+    seen = set()
+    new_points = dict((target['target'], target['datapoints'])
+                      for target in update)
+    for target in data:
+        name = target['target']
+        seen.add(name)
+        datapoints = [t for t in target['datapoints']
+                      if oldest < t[1] <= since]
+        datapoints.extend(t for t in new_points.get(name, ())
+                          if t[1] > oldest)
+        if datapoints:
+            merged.append(dict(target=name, datapoints=datapoints))
+    for target in update:
+        if target['target'] not in seen:
+            datapoints = [t for t in target['datapoints'] if t[1] > oldest]
+            if datapoints:
+                merged.append(dict(target=target['target'],
+                                   datapoints=datapoints))
+    return merged
+
+
+def get_window(key, minutes, fetch):
+    """
+    Series for the last `minutes` minutes of the query identified by `key`.
+    `fetch(since)` returns the series of the query with points newer than
+    the unix timestamp `since`, or of the whole window when `since` is
+    None.
+    """
+    now = time.time()
+    oldest = now - minutes * 60
+    cache_key = 'window:%s' % hashlib.md5(key).hexdigest()
+    window = cache.get(cache_key)
+    since = None
+    if window is not None and window['newest'] is not None:
+        since = int(window['newest']) - settings.METRIC_WINDOW_OVERLAP
+        if since <= oldest:
+            # A gap since the last run: nothing in the window is of use
+            since = None
+    if since is None:
+        _count('full')
+        data = fetch(None)
+    else:
+        _count('incremental')
+        data = merge(window['data'], fetch(since), since, oldest)
+    cache.set(cache_key, {'data': data, 'newest': _newest(data)},
+              minutes * 60)
+    return data
+
+
+def stats():
+    """Full and incremental fetches made by this process"""
+    with _lock:
+        return dict(_counters)
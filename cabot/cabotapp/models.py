@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from polymorphic import PolymorphicModel
 from django.contrib.auth.models import User
 from celery.exceptions import SoftTimeLimitExceeded
@@ -9,20 +10,21 @@ from .alert import (send_alert, AlertPluginUserData)
 from .calendar import get_events
 from .influx import parse_metric
 from .tasks import update_service, update_instance
+from .schedule import next_slot
+from cabot_agent import icmp, probes
+from cabot_agent.probes import RAW_DATA_LIMIT, read_http_body
+from . import http_pool, metric_eval
 from datetime import datetime, timedelta
 from django.utils import timezone
 
 import json
 import re
 import time
-import subprocess
 import yaml
 
 import requests
 from celery.utils.log import get_task_logger
 
-RAW_DATA_LIMIT = 500000
-
 logger = get_task_logger(__name__)
 
 CHECK_TYPES = (
@@ -34,21 +36,29 @@ CHECK_TYPES = (
 )
 
 
-def serialize_recent_results(recent_results):
-    if not recent_results:
-        return ''
+# Points of metric series kept with a result: about as many as fit in its
+# raw data, at some 40 bytes a point as indented JSON
+RAW_POINTS_LIMIT = RAW_DATA_LIMIT // 40
 
-    def result_to_value(result):
-        if result.succeeded:
-            return '1'
-        else:
-            return '-1'
-    vals = [result_to_value(r) for r in recent_results]
-    vals.reverse()
+# Outcomes kept on each check to work out its status and health
+RECENT_OUTCOMES_LIMIT = 10
+PASSED_OUTCOME = '1'
+FAILED_OUTCOME = '0'
+
+
+def serialize_recent_results(recent_outcomes):
+    """
+    `recent_outcomes`, newest first, as the oldest first, comma separated
+    values the health sparkline draws
+    """
+    if not recent_outcomes:
+        return ''
+    vals = ['1' if outcome == PASSED_OUTCOME else '-1'
+            for outcome in reversed(recent_outcomes)]
     return ','.join(vals)
 
 
-def calculate_debounced_passing(recent_results, debounce=0):
+def calculate_debounced_passing(recent_outcomes, debounce=0):
     """
     `debounce` is the number of previous failures we need (not including this)
     to mark a search as passing or failing
@@ -56,13 +66,10 @@ def calculate_debounced_passing(recent_results, debounce=0):
       True if passing given debounce factor
       False if failing
     """
-    if not recent_results:
+    if not recent_outcomes:
         return True
-    debounce_window = recent_results[:debounce + 1]
-    for r in debounce_window:
-        if r.succeeded:
-            return True
-    return False
+    debounce_window = recent_outcomes[:debounce + 1]
+    return PASSED_OUTCOME in debounce_window
 
 
 class CheckGroupMixin(models.Model):
@@ -370,7 +377,26 @@ class StatusCheck(PolymorphicModel):
     calculated_status = models.CharField(
         max_length=50, choices=Service.STATUSES, default=Service.CALCULATED_PASSING_STATUS, blank=True)
     last_run = models.DateTimeField(null=True)
+    next_run_at = models.DateTimeField(null=True, editable=False, db_index=True)
+    # When the scheduler last sent the check to the workers
+    dispatched_at = models.DateTimeField(null=True, editable=False)
     cached_health = models.TextField(editable=False, null=True)
+    # Outcomes of the most recent results, newest first, so recording a
+    # result needn't read the earlier ones back
+    recent_outcomes = models.CharField(
+        max_length=RECENT_OUTCOMES_LIMIT, default='', blank=True,
+        editable=False)
+    agent = models.CharField(
+        max_length=100,
+        blank=True,
+        default='',
+        db_index=True,
+        help_text='Name of the remote agent that runs this check near its '
+                  'target, which is the username of the account the agent '
+                  'signs in with. Leave blank to run it from the Cabot '
+                  'workers. '
+                  'Only HTTP, ICMP and TCP checks can run on agents.',
+    )
 
     # Graphite/InfluxDB checks
     metric = models.TextField(
@@ -414,6 +440,16 @@ class StatusCheck(PolymorphicModel):
         help_text='The "where clause" for selecting the metric'
     )
 
+    push_down_aggregates = models.BooleanField(
+        default=False,
+        help_text='Have InfluxDB compute the max, min, mean and count of '
+                  'the points of each series that would be checked, rather '
+                  'than fetching them. Needs InfluxDB 1.2 or later, a plain '
+                  'field selector and no "time()" in the group by. '
+                  '"==" checks and checks expecting a number of metrics '
+                  'always fetch the points.',
+    )
+
     check_type = models.CharField(
         choices=CHECK_TYPES,
         max_length=100,
@@ -506,6 +542,28 @@ class StatusCheck(PolymorphicModel):
         help_text='Alert if build queued for more than this many minutes.',
     )
 
+    # ICMP checks
+    icmp_probe_count = models.PositiveIntegerField(
+        default=3,
+        help_text='Number of echo requests to send on each run, at most 100.',
+    )
+    icmp_probe_interval = models.PositiveIntegerField(
+        default=200,
+        help_text='Milliseconds between echo requests. All the requests '
+                  'must be sent within a quarter of the worker time limit.',
+    )
+    icmp_max_loss = models.PositiveIntegerField(
+        default=50,
+        help_text='Fail if more than this percentage of echo requests get '
+                  'no reply.',
+    )
+    icmp_max_rtt = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Fail if the 95th percentile round trip time is above '
+                  'this many milliseconds.',
+    )
+
     class Meta(PolymorphicModel.Meta):
         ordering = ['name']
 
@@ -524,9 +582,22 @@ class StatusCheck(PolymorphicModel):
             return None
 
     def run(self):
+        result = self.execute()
+        result.save()
+        self.record_outcomes([result])
+
+    def execute(self):
+        """
+        Runs the check and returns its unsaved `StatusCheckResult`.
+        """
         start = timezone.now()
         try:
-            result = self._run()
+            if self.agent:
+                result = self.stale_result(
+                    u'No result from agent %s in the last %s minutes' % (
+                        self.agent, self.frequency))
+            else:
+                result = self._run()
         except SoftTimeLimitExceeded as e:
             result = StatusCheckResult(check=self)
             result.error = u'Error in performing check: Celery soft time limit exceeded'
@@ -538,9 +609,46 @@ class StatusCheck(PolymorphicModel):
         finish = timezone.now()
         result.time = start
         result.time_complete = finish
-        result.save()
-        self.last_run = finish
-        self.save()
+        return result
+
+    @property
+    def run_frequency(self):
+        """
+        Minutes between scheduled runs. Checks that are also told their
+        results can run less often than `frequency`.
+        """
+        return self.frequency
+
+    def next_run(self):
+        """
+        When the scheduler should next run the check, or None for as soon
+        as it can
+        """
+        if self.agent:
+            # Only run to fail the check once its agent stops sending
+            # results, allowing for results spooled between uploads
+            return (self.last_run or timezone.now()) + timedelta(
+                minutes=self.frequency, seconds=settings.AGENT_RESULT_GRACE)
+        if not self.last_run:
+            return None
+        return next_slot(self.pk, self.run_frequency, self.last_run)
+
+    def stale_result(self, error):
+        """
+        A failing result with `error` for a check whose results are sent
+        in, unless one arrived in the last `frequency` minutes while this
+        run was waiting to start
+        """
+        result = StatusCheckResult(check=self)
+        last = self.last_result()
+        cutoff = timezone.now() - timedelta(minutes=self.frequency)
+        if last is not None and last.time_complete > cutoff:
+            result.succeeded = last.succeeded
+            result.error = last.error
+        else:
+            result.succeeded = False
+            result.error = error
+        return result
 
     def _run(self):
         """
@@ -548,25 +656,113 @@ class StatusCheck(PolymorphicModel):
         """
         raise NotImplementedError('Subclasses should implement')
 
-    def save(self, *args, **kwargs):
+    @classmethod
+    def prefetch(cls, checks):
+        """
+        Called with a batch of checks of this type before they run, to do
+        work for the whole batch at once. Does nothing by default.
+        """
+        pass
+
+    # Fields kept up to date by record_outcomes, rather than saved as loaded
+    RECORDED_FIELDS = ('recent_outcomes', 'last_run', 'calculated_status',
+                       'cached_health', 'next_run_at')
+    # Fields only the scheduler writes, with queryset updates
+    SCHEDULER_FIELDS = ('dispatched_at',)
+
+    def update_status(self):
+        """
+        Works out the check's status, health and next run from its recent
+        outcomes
+        """
         if self.last_run:
-            recent_results = list(self.recent_results())
-            if calculate_debounced_passing(recent_results, self.debounce):
+            if calculate_debounced_passing(self.recent_outcomes,
+                                           self.debounce):
                 self.calculated_status = Service.CALCULATED_PASSING_STATUS
             else:
                 self.calculated_status = Service.CALCULATED_FAILING_STATUS
-            self.cached_health = serialize_recent_results(recent_results)
-            try:
-                updated = StatusCheck.objects.get(pk=self.pk)
-            except StatusCheck.DoesNotExist as e:
-                logger.error('Cannot find myself (check %s) in the database, presumably have been deleted' % self.pk)
-                return
+            self.cached_health = serialize_recent_results(self.recent_outcomes)
         else:
+            self.recent_outcomes = ''
             self.cached_health = ''
             self.calculated_status = Service.CALCULATED_PASSING_STATUS
-        ret = super(StatusCheck, self).save(*args, **kwargs)
-        self.update_related_services()
-        self.update_related_instances()
+        self.next_run_at = self.next_run()
+
+    def record_outcomes(self, results, update_related=True):
+        """
+        Adds the outcomes of the saved `results` of the check to its recent
+        outcomes and saves its status with them. Returns False if the check
+        has been deleted.
+        """
+        results = sorted(results, key=lambda r: r.time_complete)
+        new_outcomes = ''.join(
+            PASSED_OUTCOME if result.succeeded else FAILED_OUTCOME
+            for result in reversed(results))
+        if not self._save_recorded(self.recent_outcomes, self.last_run,
+                                   self.debounce, new_outcomes,
+                                   results[-1].time_complete):
+            return False
+        if update_related:
+            self.update_related_services()
+            self.update_related_instances()
+        return True
+
+    def _save_recorded(self, outcomes, last_run, debounce, new_outcomes='',
+                       new_last_run=None):
+        """
+        Saves the RECORDED_FIELDS worked out from the row's `outcomes`,
+        `last_run` and `debounce` with `new_outcomes` and `new_last_run`
+        added. The row is only updated if it still has the values they were
+        worked out from, and tried again with fresh ones if not, so results
+        recorded and edits saved at the same time aren't lost. Returns False
+        if the check has been deleted.
+        """
+        while True:
+            self.recent_outcomes = (new_outcomes + outcomes)[
+                :RECENT_OUTCOMES_LIMIT]
+            self.last_run = max(last_run, new_last_run) \
+                if last_run and new_last_run else last_run or new_last_run
+            self.debounce = debounce
+            self.update_status()
+            if StatusCheck.objects.filter(
+                    pk=self.pk, recent_outcomes=outcomes, last_run=last_run,
+                    debounce=debounce).update(**dict(
+                        (name, getattr(self, name))
+                        for name in self.RECORDED_FIELDS)):
+                return True
+            try:
+                outcomes, last_run, debounce = StatusCheck.objects.filter(
+                    pk=self.pk).values_list(
+                    'recent_outcomes', 'last_run', 'debounce').get()
+            except StatusCheck.DoesNotExist:
+                logger.error('Cannot find myself (check %s) in the database, presumably have been deleted' % self.pk)
+                return False
+
+    def save(self, *args, **kwargs):
+        # Batched runs update the related services once for the whole batch
+        update_related = kwargs.pop('update_related', True)
+        if self.pk is None or 'update_fields' in kwargs or \
+                kwargs.get('force_insert'):
+            self.update_status()
+            ret = super(StatusCheck, self).save(*args, **kwargs)
+        else:
+            try:
+                outcomes, last_run = StatusCheck.objects.filter(
+                    pk=self.pk).values_list('recent_outcomes', 'last_run').get()
+            except StatusCheck.DoesNotExist:
+                logger.error('Cannot find myself (check %s) in the database, presumably have been deleted' % self.pk)
+                return
+            # The fields record_outcomes keeps are worked out again from the
+            # row, rather than written back as they were loaded
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and
+                f.name not in self.RECORDED_FIELDS + self.SCHEDULER_FIELDS]
+            ret = super(StatusCheck, self).save(*args, **kwargs)
+            self._save_recorded(outcomes, last_run, self.debounce)
+        if update_related:
+            self.update_related_services()
+            self.update_related_instances()
         return ret
 
     def duplicate(self, inst_set=(), serv_set=()):
@@ -574,6 +770,7 @@ class StatusCheck(PolymorphicModel):
         new_check.pk = None
         new_check.id = None
         new_check.last_run = None
+        new_check.dispatched_at = None
         new_check.save()
         for linked in list(inst_set) + list(serv_set):
             linked.status_checks.add(new_check)
@@ -594,25 +791,115 @@ class ICMPStatusCheck(StatusCheck):
     class Meta(StatusCheck.Meta):
         proxy = True
 
+    # Probes sent per run at most. Sending them and waiting for the last
+    # reply must take well under the soft time limit of the batch of checks
+    # it runs in, or the whole batch times out.
+    MAX_PROBE_COUNT = 100
+    MAX_PROBE_TIME_FRACTION = 0.25
+
     @property
     def check_category(self):
         return "ICMP/Ping Check"
 
+    @classmethod
+    def max_probe_time(cls):
+        """Seconds a run may take to send its probes and hear back"""
+        return settings.CELERYD_TASK_SOFT_TIME_LIMIT * \
+            cls.MAX_PROBE_TIME_FRACTION
+
+    def probe_time(self):
+        return (self.icmp_probe_count or 0) * \
+            (self.icmp_probe_interval or 0) / 1000.0 + settings.ICMP_TIMEOUT
+
+    def clean(self):
+        errors = {}
+        if self.icmp_probe_count > self.MAX_PROBE_COUNT:
+            errors['icmp_probe_count'] = [
+                u'At most %s echo requests can be sent per run' %
+                self.MAX_PROBE_COUNT]
+        elif self.probe_time() > self.max_probe_time():
+            errors['icmp_probe_interval'] = [
+                u'Sending %s echo requests %s ms apart takes too long: '
+                u'they must be sent within %d seconds' % (
+                    self.icmp_probe_count, self.icmp_probe_interval,
+                    self.max_probe_time() - settings.ICMP_TIMEOUT)]
+        if errors:
+            raise ValidationError(errors)
+
+    def ping_options(self):
+        count = min(max(self.icmp_probe_count or 1, 1), self.MAX_PROBE_COUNT)
+        interval = (self.icmp_probe_interval or 0) / 1000.0
+        # Checks saved before the limits were enforced are held to them too
+        max_interval = (self.max_probe_time() - settings.ICMP_TIMEOUT) / count
+        return {
+            'count': count,
+            'interval': max(min(interval, max_interval), 0),
+            'timeout': settings.ICMP_TIMEOUT,
+        }
+
+    def agent_definition(self):
+        try:
+            address = self.instance_set.get().address
+        except (Instance.DoesNotExist, Instance.MultipleObjectsReturned):
+            return None
+        return {
+            'type': 'icmp',
+            'address': address,
+            'options': self.ping_options(),
+            'max_loss': self.icmp_max_loss,
+            'max_rtt': self.icmp_max_rtt,
+        }
+
+    @classmethod
+    def prefetch(cls, checks):
+        """
+        Pings the instances of a whole batch of checks at once, one round
+        for each set of probe options in the batch. Checks without exactly
+        one instance are left to fail when run, as they do on their own.
+        """
+        checks = [check for check in checks if not check.agent]
+        through = Instance.status_checks.through
+        addresses = {}
+        for check_id, address in through.objects.filter(
+                statuscheck__in=[check.id for check in checks]
+        ).values_list('statuscheck', 'instance__address'):
+            addresses.setdefault(check_id, []).append(address)
+        targets = dict((check_id, check_addresses[0])
+                       for check_id, check_addresses in addresses.items()
+                       if len(check_addresses) == 1)
+        by_options = {}
+        for check in checks:
+            if check.id in targets:
+                options = tuple(sorted(check.ping_options().items()))
+                by_options.setdefault(options, []).append(check)
+        for options, option_checks in by_options.items():
+            pings = icmp.ping_hosts(
+                set(targets[check.id] for check in option_checks),
+                **dict(options))
+            for check in option_checks:
+                check._ping = pings[targets[check.id]]
+
     def _run(self):
         result = StatusCheckResult(check=self)
-        instances = self.instance_set.all()
-        target = self.instance_set.get().address
-
-        # We need to read both STDOUT and STDERR because ping can write to both, depending on the kind of error. Thanks a lot, ping.
-        ping_process = subprocess.Popen("ping -c 1 " + target, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, shell=True)
-        response = ping_process.wait()
-
-        if response == 0:
-            result.succeeded = True
+        ping = self.__dict__.pop('_ping', None)
+        if ping is None:
+            target = self.instance_set.get().address
+            ping = icmp.ping_hosts([target], **self.ping_options())[target]
+
+        stats = ping.stats()
+        result.raw_data = json.dumps(stats, separators=(',', ':'))
+        result.succeeded = False
+        if not ping.received:
+            result.error = ping.error or u'No reply from %s' % ping.address
+        elif stats['loss'] > self.icmp_max_loss:
+            result.error = u'Packet loss %s%% (max %s%%)' % (
+                stats['loss'], self.icmp_max_loss)
+        elif self.icmp_max_rtt is not None and \
+                stats['p95'] > self.icmp_max_rtt:
+            result.error = u'95th percentile RTT %s ms (max %s ms)' % (
+                stats['p95'], self.icmp_max_rtt)
         else:
-            output = ping_process.stdout.read()
-            result.succeeded = False
-            result.error = output
+            result.succeeded = True
 
         return result
 
@@ -665,7 +952,17 @@ class GraphiteStatusCheck(StatusCheck):
                               group_by=self.group_by,
                               fill_empty=self.fill_empty,
                               where_clause=self.where_clause,
-                              time_delta=self.interval * 6)
+                              time_delta=self.interval * 6,
+                              keep_values=self.check_type == '==',
+                              incremental=settings.METRIC_INCREMENTAL_FETCH,
+                              aggregate=(self.push_down_aggregates and
+                                         self.check_type != '==' and
+                                         not self.expected_num_metrics),
+                              # Every series is checked for enough
+                              # matching metrics, otherwise only those
+                              # stored with the result are kept
+                              raw_points=(None if self.expected_num_metrics
+                                          else RAW_POINTS_LIMIT))
 
         result = StatusCheckResult(
             check=self,
@@ -690,33 +987,13 @@ class GraphiteStatusCheck(StatusCheck):
         failure_value = 0
         failed_metric_name = None
         matched_metrics = 0
+        value = float(self.value)
 
         # First do some crazy average checks (if we expect more than 1 metric)
         if series['num_series_with_data'] > 0:
             result.average_value = series['average_value']
-            if self.check_type == '<':
-                failed = not float(series['min']) < float(self.value)
-                if failed:
-                    failure_value = series['min']
-            elif self.check_type == '<=':
-                failed = not float(series['min']) <= float(self.value)
-                if failed:
-                    failure_value = series['min']
-            elif self.check_type == '>':
-                failed = not float(series['max']) > float(self.value)
-                if failed:
-                    failure_value = series['max']
-            elif self.check_type == '>=':
-                failed = not float(series['max']) >= float(self.value)
-                if failed:
-                    failure_value = series['max']
-            elif self.check_type == '==':
-                failed = not float(self.value) in series['all_values']
-                if failed:
-                    failure_value = float(self.value)
-            else:
-                raise Exception(u'Check type %s not supported' %
-                                self.check_type)
+            failed, failure_value = metric_eval.check_aggregates(
+                series, self.check_type, value)
 
         if series['num_series_with_data'] < self.expected_num_hosts:
             failed = True
@@ -724,55 +1001,15 @@ class GraphiteStatusCheck(StatusCheck):
         reference_point = time.time() - ((self.interval + 2) * 60)
 
         if self.expected_num_metrics > 0:
-            json_series = series['raw']
-            logger.info("Processing series " + str(json_series))
-            for line in json_series:
-                matched_metrics = 0
-                metric_failed = True
-
-                for point in line['datapoints']:
-
-                    last_value = point[0]
-                    time_stamp = point[1]
-
-                    if time_stamp <= reference_point:
-                        logger.debug('Point %s is older than ref ts %d' % \
-                            (str(point), reference_point))
-                        continue
-
-                    if last_value is not None:
-                        if self.check_type == '<':
-                            metric_failed = not last_value < float(self.value)
-                        elif self.check_type == '<=':
-                            metric_failed = not last_value <= float(self.value)
-                        elif self.check_type == '>':
-                            metric_failed = not last_value > float(self.value)
-                        elif self.check_type == '>=':
-                            metric_failed = not last_value >= float(self.value)
-                        elif self.check_type == '==':
-                            metric_failed = not last_value == float(self.value)
-                        else:
-                            raise Exception(u'Check type %s not supported' %
-                                            self.check_type)
-                        if metric_failed:
-                            failure_value = last_value
-                            failed_metric_name = line['target']
-                        else:
-                            matched_metrics += 1
-                            logger.info("Metrics matched: " + str(matched_metrics))
-                            logger.info("Required metrics: " + str(self.expected_num_metrics))
-                    else:
-                        failed = True
-
-                logger.info("Processing series ...")
-
-                if matched_metrics < self.expected_num_metrics:
-                    failed = True
-                    failure_value = None
-                    failed_metric_name = line['target']
-                    break
-                else:
-                    failed = False
+            logger.debug('Processing %d series' % len(series['raw']))
+            failed, failure_value, failed_metric_name, matched_metrics = \
+                metric_eval.check_series(series['raw'],
+                                         self.check_type,
+                                         value,
+                                         self.expected_num_metrics,
+                                         reference_point,
+                                         failed,
+                                         failure_value)
 
         try:
             if threshold is not None:
@@ -801,6 +1038,46 @@ class InfluxDBStatusCheck(GraphiteStatusCheck):
         proxy = True
 
 
+def _load_yaml(value):
+    try:
+        return yaml.load(value)
+    except:
+        return value
+
+
+class CompiledHttpCheck(object):
+    """
+    The parsed YAML and compiled regexes of an HTTP check's configuration,
+    so that runs don't parse them again. Raises `re.error` for an invalid
+    regex.
+    """
+
+    def __init__(self, check):
+        self.http_params = _load_yaml(check.http_params)
+        self.http_body = _load_yaml(check.http_body)
+        if check.text_match is not None:
+            self.text_match = re.compile(check.text_match)
+        else:
+            self.text_match = None
+        header_match = _load_yaml(check.header_match)
+        if type(header_match) is dict and header_match:
+            self.header_match = [(header, re.compile(match))
+                                 for header, match in header_match.iteritems()]
+        else:
+            self.header_match = []
+
+    @staticmethod
+    def version(check):
+        return (check.http_params, check.http_body, check.text_match,
+                check.header_match)
+
+
+# Worker-side cache of (version, CompiledHttpCheck) by check id. Editing a
+# check changes its version, so the next run compiles it again.
+_compiled_http_checks = {}
+COMPILED_HTTP_CHECKS_LIMIT = 10000
+
+
 class HttpStatusCheck(StatusCheck):
 
     class Meta(StatusCheck.Meta):
@@ -810,66 +1087,127 @@ class HttpStatusCheck(StatusCheck):
     def check_category(self):
         return "HTTP check"
 
+    def compiled(self):
+        version = CompiledHttpCheck.version(self)
+        cached = _compiled_http_checks.get(self.pk)
+        if cached is None or cached[0] != version:
+            if len(_compiled_http_checks) >= COMPILED_HTTP_CHECKS_LIMIT:
+                _compiled_http_checks.clear()
+            cached = (version, CompiledHttpCheck(self))
+            _compiled_http_checks[self.pk] = cached
+        return cached[1]
+
+    def clean(self):
+        """Report invalid YAML and regexes when the check is saved"""
+        errors = {}
+        for field in ('http_params', 'http_body', 'header_match'):
+            value = getattr(self, field)
+            if value:
+                try:
+                    yaml.load(value)
+                except yaml.YAMLError as e:
+                    errors[field] = [u'Invalid YAML: %s' % e]
+        if self.text_match:
+            try:
+                re.compile(self.text_match)
+            except re.error as e:
+                errors['text_match'] = [u'Invalid regex: %s' % e]
+        if self.header_match and 'header_match' not in errors:
+            header_match = yaml.load(self.header_match)
+            if type(header_match) is not dict:
+                errors['header_match'] = [
+                    u'Should be a YAML mapping of "header: regex"']
+            else:
+                for header, match in header_match.iteritems():
+                    try:
+                        re.compile(match)
+                    except (re.error, TypeError) as e:
+                        errors.setdefault('header_match', []).append(
+                            u'Invalid regex for %s: %s' % (header, e))
+        if errors:
+            raise ValidationError(errors)
+
+    def agent_definition(self):
+        compiled = self.compiled()
+        return {
+            'type': 'http',
+            'endpoint': self.endpoint,
+            'http_method': self.http_method,
+            'username': self.username,
+            'password': self.password,
+            'http_params': compiled.http_params,
+            'http_body': compiled.http_body,
+            'allow_http_redirects': self.allow_http_redirects,
+            'text_match': self.text_match,
+            'header_match': [(header, match.pattern)
+                             for header, match in compiled.header_match],
+            'status_code': int(self.status_code) if self.status_code
+            else None,
+            'timeout': self.timeout,
+            'verify_ssl_certificate': self.verify_ssl_certificate,
+            'max_body_bytes': settings.HTTP_CHECK_MAX_BODY_BYTES,
+        }
+
     def _run(self):
         result = StatusCheckResult(check=self)
         if self.username:
             auth = (self.username, self.password)
         else:
             auth = None
+        compiled = self.compiled()
 
         try:
-            http_params = yaml.load(self.http_params)
-        except:
-            http_params = self.http_params
-
-        try:
-            http_body = yaml.load(self.http_body)
-        except:
-            http_body = self.http_body
-
-        try:
-            header_match = yaml.load(self.header_match)
-        except:
-            header_match = self.header_match
-
-        try:
-            resp = requests.request(
+            resp = http_pool.request(
                 method = self.http_method,
                 url = self.endpoint,
-                data = http_body,
-                params = http_params,
+                data = compiled.http_body,
+                params = compiled.http_params,
                 timeout = self.timeout,
                 verify = self.verify_ssl_certificate,
                 auth = auth,
-                allow_redirects = self.allow_http_redirects
+                allow_redirects = self.allow_http_redirects,
+                stream = True
             )
+            try:
+                wrong_code = (self.status_code and
+                              resp.status_code != int(self.status_code))
+                if wrong_code:
+                    pattern = None
+                else:
+                    pattern = compiled.text_match
+                raw_data, matched, complete = read_http_body(
+                    resp, pattern, settings.HTTP_CHECK_MAX_BODY_BYTES)
+            finally:
+                resp.close()
         except requests.RequestException as e:
             result.error = u'Request error occurred: %s' % (e.message,)
             result.succeeded = False
         else:
-            result.raw_data = resp.content
+            result.raw_data = raw_data
             result.succeeded = False
 
-            if self.status_code and resp.status_code != int(self.status_code):
+            if wrong_code:
                 result.error = u'Wrong code: got %s (expected %s)' % (
                     resp.status_code, int(self.status_code))
                 return result
 
-            if self.text_match is not None:
-                if not re.search(self.text_match, resp.content):
+            if self.text_match is not None and not matched:
+                if complete:
                     result.error = u'Failed to find match regex /%s/ in response body' % self.text_match
-                    return result
+                else:
+                    result.error = u'Failed to find match regex /%s/ in first %s bytes of response body' % (
+                        self.text_match, settings.HTTP_CHECK_MAX_BODY_BYTES)
+                return result
 
-            if type(header_match) is dict and header_match:
-                for header, match in header_match.iteritems():
-                    if header not in resp.headers:
-                        result.error = u'Missing response header: %s' % (header)
-                        return result
+            for header, match in compiled.header_match:
+                if header not in resp.headers:
+                    result.error = u'Missing response header: %s' % (header)
+                    return result
 
-                    value = resp.headers[header]
-                    if not re.match(match, value):
-                        result.error = u'Mismatch in header: %s / %s' % (header, value)
-                        return result
+                value = resp.headers[header]
+                if not match.match(value):
+                    result.error = u'Mismatch in header: %s / %s' % (header, value)
+                    return result
 
             # Mark it as success. phew!!
             result.succeeded = True
@@ -889,11 +1227,17 @@ class JenkinsStatusCheck(StatusCheck):
     def failing_short_status(self):
         return 'Job failing on Jenkins'
 
+    @property
+    def run_frequency(self):
+        if settings.JENKINS_WEBHOOK_TOKEN:
+            # Builds are pushed to the webhook: polling only reconciles
+            return max(self.frequency, settings.JENKINS_RECONCILE_INTERVAL)
+        return self.frequency
+
     def _run(self):
         result = StatusCheckResult(check=self)
         try:
             status = get_job_status(self.name)
-            active = status['active']
             result.job_number = status['job_number']
             if status['status_code'] == 404:
                 result.error = u'Job %s not found on Jenkins' % self.name
@@ -909,8 +1253,17 @@ class JenkinsStatusCheck(StatusCheck):
             result.error = u'Error fetching from Jenkins - %s' % e.message
             result.succeeded = False
             return result
+        return self.result_from_status(status, result)
 
-        if not active:
+    def result_from_status(self, status, result=None):
+        """
+        The result for a job `status` from `get_job_status`, or of a build
+        notification
+        """
+        if result is None:
+            result = StatusCheckResult(check=self,
+                                       job_number=status['job_number'])
+        if not status['active']:
             # We will fail if the job has been disabled
             result.error = u'Job "%s" disabled on Jenkins' % self.name
             result.succeeded = False
@@ -937,6 +1290,69 @@ class JenkinsStatusCheck(StatusCheck):
         return result
 
 
+class TCPStatusCheck(StatusCheck):
+    """
+    Opens a TCP connection to `endpoint`, given as host:port
+    """
+
+    class Meta(StatusCheck.Meta):
+        proxy = True
+
+    @property
+    def check_category(self):
+        return "TCP check"
+
+    def clean(self):
+        try:
+            probes.parse_address(self.endpoint or '')
+        except ValueError as e:
+            raise ValidationError({'endpoint': [e.message]})
+
+    def agent_definition(self):
+        return {
+            'type': 'tcp',
+            'endpoint': self.endpoint,
+            'timeout': self.timeout,
+        }
+
+    def _run(self):
+        result = StatusCheckResult(check=self)
+        host, port = probes.parse_address(self.endpoint)
+        connect_ms, error = probes.tcp_connect(host, port, self.timeout or 10)
+        result.succeeded = error is None
+        result.error = error
+        if connect_ms is not None:
+            result.raw_data = json.dumps({'connect_ms': connect_ms})
+        return result
+
+
+class PassiveStatusCheck(StatusCheck):
+    """
+    A check whose results are pushed to the passive results API by cron
+    jobs, pipelines and agents. It's only run, to fail it, once no result
+    has been pushed for `frequency` minutes.
+    """
+
+    class Meta(StatusCheck.Meta):
+        proxy = True
+
+    @property
+    def check_category(self):
+        return "Passive check"
+
+    @property
+    def failing_short_status(self):
+        return 'No recent result pushed'
+
+    def next_run(self):
+        return (self.last_run or timezone.now()) + \
+            timedelta(minutes=self.frequency)
+
+    def _run(self):
+        return self.stale_result(
+            u'No result pushed in the last %s minutes' % self.frequency)
+
+
 class StatusCheckResult(models.Model):
 
     """
@@ -981,9 +1397,12 @@ class StatusCheckResult(models.Model):
         else:
             return self.error
 
-    def save(self, *args, **kwargs):
+    def truncate_raw_data(self):
         if isinstance(self.raw_data, basestring):
             self.raw_data = self.raw_data[:RAW_DATA_LIMIT]
+
+    def save(self, *args, **kwargs):
+        self.truncate_raw_data()
         return super(StatusCheckResult, self).save(*args, **kwargs)
 
 
@@ -1027,6 +1446,56 @@ class Shift(models.Model):
         return "%s: %s to %s%s" % (self.user.username, self.start, self.end, deleted)
 
 
+class SchedulerNode(models.Model):
+    """
+    A check scheduler process. Nodes heartbeat every tick, and the due
+    checks are sharded over the nodes whose heartbeat is recent enough.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    last_heartbeat = models.DateTimeField(db_index=True)
+
+    def __unicode__(self):
+        return self.name
+
+    @classmethod
+    def heartbeat(cls, name, now=None):
+        now = now or timezone.now()
+        if not cls.objects.filter(name=name).update(last_heartbeat=now):
+            cls.objects.create(name=name, last_heartbeat=now)
+
+    @classmethod
+    def live_names(cls, now=None):
+        now = now or timezone.now()
+        cutoff = now - timedelta(seconds=settings.SCHEDULER_NODE_TIMEOUT)
+        return list(cls.objects.filter(last_heartbeat__gt=cutoff)
+                    .values_list('name', flat=True))
+
+
+class MetricName(models.Model):
+    """
+    A series name in the metric index the check form's autocomplete is
+    answered from, listed from InfluxDB by `metric_index.refresh`
+    """
+    name = models.TextField()
+
+    def __unicode__(self):
+        return self.name
+
+
+class JenkinsBuild(models.Model):
+    """
+    A finished build the Jenkins webhook has been told about, queued until
+    `record_jenkins_builds` records the results of a burst of them at once
+    """
+    job_name = models.TextField()
+    number = models.IntegerField()
+    succeeded = models.BooleanField(default=False)
+    received = models.DateTimeField(auto_now_add=True)
+
+    def __unicode__(self):
+        return u'%s #%s' % (self.job_name, self.number)
+
+
 def get_duty_officers(at_time=None):
     """Returns a list of duty officers for a given time or now if none given"""
     duty_officers = []
@@ -39,23 +39,36 @@ if CONNECTION:
         DIMENSIONS = {}
 
 
-def _notify_cloudwatch(task_name, state):
-    '''
-    Update cloudwatch with a metric alert about a task
-    '''
+def _put_metric(name, value, unit=None):
     if CONNECTION:
         if PREFIX:
-            metric = '%s.%s.%s' % (PREFIX, task_name, state)
+            metric = '%s.%s' % (PREFIX, name)
         else:
-            metric = '%s.%s' % (task_name, state)
+            metric = name
 
         try:
-            CONNECTION.put_metric_data(NAMESPACE, metric, 1,
+            CONNECTION.put_metric_data(NAMESPACE, metric, value, unit=unit,
                                        dimensions=DIMENSIONS)
         except:
             logger.exception('Error sending cloudwatch metric')
 
 
+def _notify_cloudwatch(task_name, state):
+    '''
+    Update cloudwatch with a metric alert about a task
+    '''
+    _put_metric('%s.%s' % (task_name, state), 1)
+
+
+def record_queue_lag(queue, lag):
+    '''
+    Record how many seconds a batch of checks waited in `queue` past the
+    time it was due to run, to size the worker pool of each queue
+    '''
+    logger.info('Queue lag on %s: %.1fs' % (queue, lag))
+    _put_metric('queue_lag.%s' % queue, lag, unit='Seconds')
+
+
 @task_success.connect
 def notify_success(sender=None, *args, **kwargs):
     '''
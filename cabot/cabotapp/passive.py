@@ -0,0 +1,122 @@
+"""
+Ingestion of results pushed for passive checks.
+
+Cron jobs, batch pipelines and remote agents post their results in bulk
+rather than having a worker run anything. Each result names its check by id or
+by name. The checks of a whole request are loaded with two queries, the
+results written with batched inserts and each check, service and instance
+involved updated once.
+"""
+from __future__ import absolute_import
+
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class IngestError(ValueError):
+    pass
+
+
+def _parse_time(value, now):
+    if value is None:
+        return now
+    try:
+        time = datetime.datetime.utcfromtimestamp(float(value)).replace(
+            tzinfo=timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        raise IngestError('time must be a unix timestamp')
+    # Results can't come from the future
+    return min(time, now)
+
+
+def _parse_result(item, now):
+    if not isinstance(item, dict):
+        raise IngestError('result must be an object')
+    if 'check' in item:
+        if not isinstance(item['check'], (int, long)):
+            raise IngestError('check must be a check id')
+    elif not isinstance(item.get('name'), basestring):
+        raise IngestError('result must have a check id or name')
+    if not isinstance(item.get('succeeded'), bool):
+        raise IngestError('succeeded must be true or false')
+    error = item.get('error') or u''
+    raw_data = item.get('raw_data')
+    if not isinstance(error, basestring) or not (
+            raw_data is None or isinstance(raw_data, basestring)):
+        raise IngestError('error and raw_data must be strings')
+    return {
+        'time': _parse_time(item.get('time'), now),
+        'succeeded': item['succeeded'],
+        'error': error,
+        'raw_data': raw_data,
+    }
+
+
+def ingest(items, checks=None, now=None):
+    """
+    Records the results in `items` for the passive checks they name, each
+    a dict of check (id) or name, succeeded, and optionally error,
+    raw_data and time (a unix timestamp, now by default). Returns the
+    number recorded and a list of (index, error) for the items that
+    weren't.
+
+    `checks`, if given, is the queryset of the checks results can be
+    recorded for instead of the active passive checks.
+    """
+    from .models import StatusCheck, StatusCheckResult
+    from .tasks import record_results
+    if not isinstance(items, list):
+        raise IngestError('expected a list of results')
+    if len(items) > settings.PASSIVE_INGEST_MAX_RESULTS:
+        raise IngestError('at most %s results can be pushed at once' %
+                          settings.PASSIVE_INGEST_MAX_RESULTS)
+    now = now or timezone.now()
+    errors = []
+    parsed = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append((index, item, _parse_result(item, now)))
+        except IngestError, e:
+            errors.append((index, unicode(e)))
+
+    if checks is None:
+        checks = StatusCheck.objects.filter(
+            polymorphic_ctype__model='passivestatuscheck', active=True)
+    ids = set(item['check'] for _, item, _ in parsed if 'check' in item)
+    names = set(item['name'] for _, item, _ in parsed if 'check' not in item)
+    by_id = dict((check.id, check)
+                 for check in checks.filter(id__in=ids)) if ids else {}
+    by_name = dict((check.name, check)
+                   for check in checks.filter(name__in=names)) \
+        if names else {}
+
+    recorded = []
+    results = []
+    for index, item, result in parsed:
+        if 'check' in item:
+            check = by_id.get(item['check'])
+        else:
+            check = by_name.get(item['name'])
+        if check is None:
+            errors.append((index, u'no check %s to record results for' %
+                           item.get('check', item.get('name'))))
+            continue
+        recorded.append(check)
+        results.append(StatusCheckResult(
+            check=check,
+            time=result['time'],
+            time_complete=result['time'],
+            succeeded=result['succeeded'],
+            error=result['error'],
+            raw_data=result['raw_data'],
+        ))
+    if results:
+        # Results are read back newest id first
+        pairs = sorted(zip(recorded, results),
+                       key=lambda pair: pair[1].time_complete)
+        recorded, results = [list(side) for side in zip(*pairs)]
+        record_results(recorded, results,
+                       batch_size=settings.PASSIVE_INGEST_BATCH_SIZE)
+    return len(results), sorted(errors)
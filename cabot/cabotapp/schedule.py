@@ -0,0 +1,73 @@
+"""
+Helpers for spreading check runs evenly over time.
+
+Each check gets a stable phase within its frequency period, derived from a
+hash of its id, and runs on the slots `k * period + phase` (seconds since
+the epoch). Checks keep their phase across runs and scheduler restarts, so
+load stays flat over the whole period instead of clumping.
+"""
+from __future__ import absolute_import
+
+import bisect
+import calendar
+import hashlib
+from collections import Counter
+from datetime import datetime
+
+from django.utils import timezone
+
+
+# Points each scheduler node gets on the hash ring
+RING_REPLICAS = 100
+
+
+def _hash(key):
+    return int(hashlib.md5(key).hexdigest()[:8], 16)
+
+
+def check_phase(check_id, period):
+    """Stable offset in seconds, 0 <= phase < period, for a check"""
+    return _hash(str(check_id)) % period
+
+
+def frequency_period(frequency):
+    """Length of a check's period in seconds"""
+    return max(int(frequency or 0), 1) * 60
+
+
+def timestamp(dt):
+    """Whole seconds since the epoch for an aware datetime"""
+    return calendar.timegm(dt.utctimetuple())
+
+
+def next_slot(check_id, frequency, after):
+    """First time strictly after `after` that falls on the check's phase"""
+    period = frequency_period(frequency)
+    phase = check_phase(check_id, period)
+    seconds = timestamp(after)
+    slot = seconds - ((seconds - phase) % period) + period
+    return datetime.utcfromtimestamp(slot).replace(tzinfo=timezone.utc)
+
+
+def dispatch_histogram(countdowns, window):
+    """Number of checks dispatched for each second of the window"""
+    counts = Counter(int(c) for c in countdowns)
+    return [counts.get(second, 0) for second in range(window)]
+
+
+class HashRing(object):
+    """
+    Consistent hash ring sharding check ids over scheduler nodes. When a
+    node joins or leaves, only the checks on its arcs of the ring move.
+    """
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self._ring = sorted((_hash('%s:%s' % (node, i)), node)
+                            for node in nodes for i in range(replicas))
+        self._keys = [key for key, _ in self._ring]
+
+    def get_node(self, check_id):
+        if not self._ring:
+            return None
+        index = bisect.bisect(self._keys, _hash('check:%s' % check_id))
+        return self._ring[index % len(self._ring)][1]
@@ -1,13 +1,18 @@
-import random
 import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
 
 from celery import Celery
 from celery._state import set_default_app
+from celery.exceptions import SoftTimeLimitExceeded
 from celery.task import task
 
 from django.conf import settings
 from django.utils import timezone
 
+from . import http_engine, monitor, schedule
+
 celery = Celery(__name__)
 celery.config_from_object(settings)
 
@@ -21,6 +26,9 @@ celery.config_from_object(settings)
 set_default_app(celery)
 logger = logging.getLogger(__name__)
 
+# Number of check ids updated and dispatched per round trip
+SCHEDULE_CHUNK_SIZE = 500
+
 
 @task(ignore_result=True)
 def run_status_check(check_or_id):
@@ -33,19 +41,274 @@ def run_status_check(check_or_id):
     check.run()
 
 
+def execute_checks(checks, concurrency):
+    """
+    Runs `checks`, up to `concurrency` at a time, and returns their unsaved
+    results in the same order as `checks`. HTTP checks only wait on the
+    network, so they run up to HTTP_CHECK_CONCURRENCY at a time instead.
+    """
+    from .models import StatusCheckResult, HttpStatusCheck
+    http_checks = [c for c in checks if isinstance(c, HttpStatusCheck)]
+    other_checks = [c for c in checks if not isinstance(c, HttpStatusCheck)]
+    results = {}
+    try:
+        for check_class in set(type(check) for check in checks):
+            try:
+                check_class.prefetch(
+                    [check for check in checks if type(check) is check_class])
+            except SoftTimeLimitExceeded:
+                raise
+            except Exception:
+                # The checks fetch what they need themselves when run
+                logger.exception('Prefetch for %s checks failed' %
+                                 check_class.__name__)
+        for group, group_concurrency in (
+                (http_checks, max(concurrency, settings.HTTP_CHECK_CONCURRENCY)),
+                (other_checks, concurrency)):
+            for check, result in http_engine.execute_checks(
+                    group, group_concurrency):
+                results[check.id] = result
+    except SoftTimeLimitExceeded:
+        logger.error('Soft time limit exceeded with %s of %s checks run' % (
+            len(results), len(checks)))
+    now = timezone.now()
+    for check in checks:
+        if check.id not in results:
+            results[check.id] = StatusCheckResult(
+                check=check,
+                time=now,
+                time_complete=now,
+                succeeded=False,
+                error=u'Error in performing check: '
+                      u'Celery soft time limit exceeded',
+            )
+    return [results[check.id] for check in checks]
+
+
+def record_results(checks, results, batch_size=None):
+    """
+    Saves the results of a batch of checks with a single insert (or one
+    per `batch_size` results), then records their outcomes on each check
+    and updates each service and instance involved once.
+    """
+    from .models import StatusCheckResult, Service, Instance
+    for result in results:
+        result.truncate_raw_data()
+    StatusCheckResult.objects.bulk_create(results, batch_size=batch_size)
+    by_check = {}
+    for check, result in zip(checks, results):
+        by_check.setdefault(check.id, (check, []))[1].append(result)
+    for check, check_results in by_check.values():
+        check.record_outcomes(check_results, update_related=False)
+    check_ids = [check.id for check in checks]
+    for service_id in Service.objects.filter(
+            status_checks__id__in=check_ids).distinct().values_list('id', flat=True):
+        update_service.delay(service_id)
+    for instance_id in Instance.objects.filter(
+            status_checks__id__in=check_ids).distinct().values_list('id', flat=True):
+        update_instance.delay(instance_id)
+
+
 @task(ignore_result=True)
-def run_all_checks():
+def record_jenkins_builds():
+    """
+    Records a result for each Jenkins check of a job that a build finished
+    for, from the builds the webhook has queued up since the last run, with
+    one insert for the whole batch. Only the latest build of each job
+    counts, and builds no newer than the check's last recorded one are
+    ignored. The queued builds are locked and removed in the same
+    transaction as the results are written, so overlapping runs can't
+    record a build twice.
+    """
+    if not settings.JENKINS_WEBHOOK_TOKEN:
+        # The webhook is off, so there's nothing queued up
+        return
+    from .jenkins import build_status
+    from .models import JenkinsBuild, StatusCheck, StatusCheckResult
+    from django.db import transaction
+    from django.db.models import Max
+    with transaction.atomic():
+        queued = list(JenkinsBuild.objects.select_for_update().order_by(
+            'id')[:settings.JENKINS_WEBHOOK_BATCH_SIZE])
+        if not queued:
+            return
+        JenkinsBuild.objects.filter(
+            id__in=[build.id for build in queued]).delete()
+        builds = {}
+        for build in queued:
+            if build.job_name not in builds or \
+                    build.number > builds[build.job_name].number:
+                builds[build.job_name] = build
+        checks = list(StatusCheck.objects.filter(
+            polymorphic_ctype__model='jenkinsstatuscheck', active=True,
+            name__in=builds.keys()))
+        last_builds = dict(StatusCheckResult.objects.filter(
+            check__in=checks).values_list('check').annotate(Max('job_number')))
+        now = timezone.now()
+        recorded = []
+        results = []
+        for check in checks:
+            build = builds[check.name]
+            if build.number <= (last_builds.get(check.id) or 0):
+                continue
+            result = check.result_from_status(
+                build_status(build.number, build.succeeded))
+            result.time = result.time_complete = now
+            recorded.append(check)
+            results.append(result)
+        if recorded:
+            record_results(recorded, results)
+
+
+def check_route(importance):
+    """Queue and priority that checks of `importance` are sent with"""
+    return settings.CHECK_QUEUES.get(
+        importance, {'queue': settings.CELERY_DEFAULT_QUEUE})
+
+
+@task(ignore_result=True)
+def run_status_checks(check_ids, due_at=None):
+    """
+    Runs a batch of checks: loads them with one query, runs them
+    concurrently and writes their results in bulk.
+
+    `due_at` is the timestamp the batch was scheduled to start at, used to
+    report how far behind the batch's queue is running.
+    """
     from .models import StatusCheck
-    from datetime import timedelta
-    checks = StatusCheck.objects.filter(active=True).all()
-    seconds = range(60)
-    for check in checks:
-        if check.last_run:
-            next_schedule = check.last_run + timedelta(minutes=check.frequency)
-        if (not check.last_run) or timezone.now() > next_schedule:
-            delay = random.choice(seconds)
-            logger.debug('Scheduling task for %s seconds from now' % delay)
-            run_status_check.apply_async((check.id,), countdown=delay)
+    if due_at is not None:
+        delivery_info = run_status_checks.request.delivery_info or {}
+        queue = delivery_info.get('routing_key') or \
+            settings.CELERY_DEFAULT_QUEUE
+        monitor.record_queue_lag(queue, max(0, time.time() - due_at))
+    checks = list(StatusCheck.objects.filter(id__in=check_ids))
+    results = execute_checks(checks, settings.CHECK_BATCH_CONCURRENCY)
+    record_results(checks, results)
+
+
+def _chunks(items, size):
+    for offset in range(0, len(items), size):
+        yield items[offset:offset + size]
+
+
+def get_due_checks(until, limit, owns=None, pending_since=None):
+    """
+    (id, frequency, next_run_at, importance) of the active checks due to
+    run before `until`, or which have never run, oldest first. Only filters
+    on the indexed `next_run_at` column.
+
+    `owns`, if given, is called with each check id and limits the result
+    to the checks it returns True for. Checks dispatched after
+    `pending_since` that haven't run since are still waiting to, and are
+    left out.
+    """
+    from .models import StatusCheck
+    from django.db.models import F, Q
+    due = StatusCheck.objects.filter(active=True).filter(
+        Q(next_run_at__isnull=True) | Q(next_run_at__lt=until))
+    if pending_since is not None:
+        due = due.exclude(
+            Q(dispatched_at__gt=pending_since) &
+            (Q(last_run__isnull=True) | Q(last_run__lt=F('dispatched_at'))))
+    due = due.order_by('next_run_at').values_list(
+        'id', 'frequency', 'next_run_at', 'importance')
+    if owns is None:
+        return list(due[:limit])
+    return [row for row in due if owns(row[0])][:limit]
+
+
+def get_countdown(check_id, frequency, next_run_at, now, window):
+    """
+    Seconds from `now` until the check should run, or None if it isn't due
+    within `window` seconds. Checks that have never run start on their
+    phase slot in their first period when warm-up is enabled.
+    """
+    if next_run_at is None and settings.CHECK_SCHEDULE_WARMUP:
+        next_run_at = schedule.next_slot(
+            check_id, frequency, now - timedelta(seconds=1))
+    if next_run_at is None or next_run_at < now:
+        # Overdue (or warm-up disabled): spread over the coming window
+        return schedule.check_phase(check_id, window)
+    countdown = int((next_run_at - now).total_seconds())
+    if countdown >= window:
+        return None
+    return countdown
+
+
+def dispatch_due_checks(now=None, owns=None):
+    """
+    Dispatches the checks due before the next scheduler tick, each at its
+    own phase slot and on the queue for its importance. Returns the
+    per-second dispatch histogram.
+    """
+    from .models import StatusCheck
+    now = now or timezone.now()
+    window = settings.RUN_ALL_CHECKS_INTERVAL
+    # Push dispatched checks out of the due window until they have had a
+    # chance to run. The run itself sets the real `next_run_at`. Checks
+    # still queued when that runs out, behind a slow queue, aren't
+    # dispatched twice until CHECK_DISPATCH_TIMEOUT takes them as lost.
+    lease = now + timedelta(
+        seconds=window + settings.CELERYD_TASK_TIME_LIMIT)
+    due = get_due_checks(
+        now + timedelta(seconds=window), settings.CHECK_SCHEDULE_BATCH_SIZE,
+        owns=owns, pending_since=now - timedelta(
+            seconds=settings.CHECK_DISPATCH_TIMEOUT))
+    countdowns = []
+    for chunk in _chunks(due, SCHEDULE_CHUNK_SIZE):
+        dispatch = []
+        for check_id, frequency, next_run_at, importance in chunk:
+            countdown = get_countdown(
+                check_id, frequency, next_run_at, now, window)
+            if countdown is not None:
+                dispatch.append((check_id, countdown, importance))
+            elif next_run_at is None:
+                # Warming up: park it on its first slot
+                StatusCheck.objects.filter(id=check_id).update(
+                    next_run_at=schedule.next_slot(
+                        check_id, frequency, now - timedelta(seconds=1)))
+        StatusCheck.objects.filter(
+            id__in=[check_id for check_id, _, _ in dispatch]
+        ).update(next_run_at=lease, dispatched_at=now)
+        by_slot = defaultdict(list)
+        for check_id, countdown, importance in dispatch:
+            by_slot[(countdown, importance)].append(check_id)
+            countdowns.append(countdown)
+        for (countdown, importance), check_ids in sorted(by_slot.items()):
+            route = check_route(importance)
+            due_at = schedule.timestamp(now) + countdown
+            for batch in _chunks(check_ids, settings.CHECK_BATCH_SIZE):
+                logger.debug('Scheduling %s checks on %s for %s seconds '
+                             'from now' % (len(batch), route['queue'],
+                                           countdown))
+                run_status_checks.apply_async(
+                    (batch,), {'due_at': due_at}, countdown=countdown,
+                    **route)
+    histogram = schedule.dispatch_histogram(countdowns, window)
+    logger.info('Dispatched %s due checks, per second: %s' % (
+        len(countdowns), ' '.join(str(n) for n in histogram)))
+    return histogram
+
+
+def dispatch_shard(node_name, now=None):
+    """
+    One tick of a sharded scheduler node: heartbeat, then dispatch the due
+    checks that hash to this node among the live nodes.
+    """
+    from .models import SchedulerNode
+    now = now or timezone.now()
+    SchedulerNode.heartbeat(node_name, now)
+    ring = schedule.HashRing(SchedulerNode.live_names(now))
+    return dispatch_due_checks(
+        now, owns=lambda check_id: ring.get_node(check_id) == node_name)
+
+
+@task(ignore_result=True)
+def run_all_checks():
+    if settings.CHECK_SCHEDULER_SHARDED:
+        logger.debug('Checks are dispatched by the sharded scheduler nodes')
+        return
+    return dispatch_due_checks()
 
 
 @task(ignore_result=True)
@@ -80,6 +343,15 @@ def update_shifts():
     _update_shifts()
 
 
+@task(ignore_result=True)
+def refresh_metric_index():
+    if not settings.INFLUXDB_DSN:
+        logger.debug('No InfluxDB to index the metrics of')
+        return
+    from .metric_index import refresh
+    refresh()
+
+
 @task(ignore_result=True)
 def clean_db(days_to_retain=60):
     """
@@ -1,7 +1,9 @@
 from django.template import RequestContext, loader
 from datetime import datetime, timedelta, date
 from dateutil.relativedelta import relativedelta
-from django.http import HttpResponse, HttpResponseRedirect
+from django.http import (
+    HttpResponse, HttpResponseRedirect, HttpResponseBadRequest,
+    HttpResponseForbidden)
 from django.core.urlresolvers import reverse_lazy
 from django.conf import settings
 from models import (StatusCheck,
@@ -10,7 +12,10 @@ from models import (StatusCheck,
                     HttpStatusCheck,
                     ICMPStatusCheck,
                     InfluxDBStatusCheck,
+                    PassiveStatusCheck,
+                    TCPStatusCheck,
                     StatusCheckResult,
+                    JenkinsBuild,
                     UserProfile,
                     Service,
                     Instance,
@@ -20,10 +25,15 @@ from models import (StatusCheck,
 from tasks import run_status_check as _run_status_check
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.views.generic import (
     DetailView, CreateView, UpdateView, ListView, DeleteView, TemplateView, FormView, View)
 from django import forms
-from .influx import get_data, get_matching_metrics
+from .influx import get_data
+from . import metric_index
+from .jenkins import parse_notification
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.utils.timezone import utc
@@ -71,31 +81,49 @@ def run_status_check(request, pk):
     _run_status_check(check_or_id=pk)
     return HttpResponseRedirect(reverse('check', kwargs={'pk': pk}))
 
+
 def duplicate_influxdb_check(request, pk):
     pc = StatusCheck.objects.get(pk=pk)
     npk = pc.duplicate()
     return HttpResponseRedirect(reverse('update-influxdb-check', kwargs={'pk': npk}))
 
+
+def duplicate_tcp_check(request, pk):
+    pc = StatusCheck.objects.get(pk=pk)
+    npk = pc.duplicate()
+    return HttpResponseRedirect(reverse('update-tcp-check', kwargs={'pk': npk}))
+
+
+def duplicate_passive_check(request, pk):
+    pc = StatusCheck.objects.get(pk=pk)
+    npk = pc.duplicate()
+    return HttpResponseRedirect(reverse('update-passive-check', kwargs={'pk': npk}))
+
+
 def duplicate_icmp_check(request, pk):
     pc = StatusCheck.objects.get(pk=pk)
     npk = pc.duplicate()
     return HttpResponseRedirect(reverse('update-icmp-check', kwargs={'pk': npk}))
 
+
 def duplicate_instance(request, pk):
     instance = Instance.objects.get(pk=pk)
     new_instance = instance.duplicate()
     return HttpResponseRedirect(reverse('update-instance', kwargs={'pk': new_instance}))
 
+
 def duplicate_http_check(request, pk):
     pc = StatusCheck.objects.get(pk=pk)
     npk = pc.duplicate()
     return HttpResponseRedirect(reverse('update-http-check', kwargs={'pk': npk}))
 
+
 def duplicate_graphite_check(request, pk):
     pc = StatusCheck.objects.get(pk=pk)
     npk = pc.duplicate()
     return HttpResponseRedirect(reverse('update-graphite-check', kwargs={'pk': npk}))
 
+
 def duplicate_jenkins_check(request, pk):
     pc = StatusCheck.objects.get(pk=pk)
     npk = pc.duplicate()
@@ -176,6 +204,7 @@ class GraphiteStatusCheckForm(StatusCheckForm):
             'group_by',
             'fill_empty',
             'where_clause',
+            'push_down_aggregates',
             'check_type',
             'value',
             'frequency',
@@ -213,6 +242,7 @@ class InfluxDBStatusCheckForm(StatusCheckForm):
             'group_by',
             'fill_empty',
             'where_clause',
+            'push_down_aggregates',
             'check_type',
             'value',
             'frequency',
@@ -243,6 +273,48 @@ class ICMPStatusCheckForm(StatusCheckForm):
 
     class Meta:
         model = ICMPStatusCheck
+        fields = (
+            'name',
+            'icmp_probe_count',
+            'icmp_probe_interval',
+            'icmp_max_loss',
+            'icmp_max_rtt',
+            'agent',
+            'frequency',
+            'importance',
+            'active',
+            'debounce',
+        )
+        widgets = dict(**base_widgets)
+
+
+class TCPStatusCheckForm(StatusCheckForm):
+
+    class Meta:
+        model = TCPStatusCheck
+        fields = (
+            'name',
+            'endpoint',
+            'timeout',
+            'agent',
+            'frequency',
+            'importance',
+            'active',
+            'debounce',
+        )
+        widgets = dict(**base_widgets)
+        widgets.update({
+            'endpoint': forms.TextInput(attrs={
+                'style': 'width: 100%',
+                'placeholder': 'db.example.com:5432',
+            }),
+        })
+
+
+class PassiveStatusCheckForm(StatusCheckForm):
+
+    class Meta:
+        model = PassiveStatusCheck
         fields = (
             'name',
             'frequency',
@@ -271,6 +343,7 @@ class HttpStatusCheckForm(StatusCheckForm):
             'status_code',
             'timeout',
             'verify_ssl_certificate',
+            'agent',
             'frequency',
             'importance',
             'active',
@@ -507,6 +580,27 @@ class ICMPCheckUpdateView(CheckUpdateView):
     model = ICMPStatusCheck
     form_class = ICMPStatusCheckForm
 
+
+class TCPCheckCreateView(CheckCreateView):
+    model = TCPStatusCheck
+    form_class = TCPStatusCheckForm
+
+
+class TCPCheckUpdateView(CheckUpdateView):
+    model = TCPStatusCheck
+    form_class = TCPStatusCheckForm
+
+
+class PassiveCheckCreateView(CheckCreateView):
+    model = PassiveStatusCheck
+    form_class = PassiveStatusCheckForm
+
+
+class PassiveCheckUpdateView(CheckUpdateView):
+    model = PassiveStatusCheck
+    form_class = PassiveStatusCheckForm
+
+
 class GraphiteCheckUpdateView(CheckUpdateView):
     model = GraphiteStatusCheck
     form_class = GraphiteStatusCheckForm
@@ -816,14 +910,47 @@ def jsonify(d):
     return HttpResponse(json.dumps(d), content_type='application/json')
 
 
+@csrf_exempt
+@require_POST
+def jenkins_webhook(request):
+    """
+    Takes build notifications from the Jenkins Notification plugin, one
+    message or a list of them per request, and queues the finished builds
+    for `record_jenkins_builds` to record the results of the checks of the
+    jobs they're for. Authenticated by JENKINS_WEBHOOK_TOKEN in the `token`
+    parameter or the X-Cabot-Token header.
+    """
+    token = request.GET.get('token') or \
+        request.META.get('HTTP_X_CABOT_TOKEN', '')
+    if not settings.JENKINS_WEBHOOK_TOKEN or \
+            not constant_time_compare(token, settings.JENKINS_WEBHOOK_TOKEN):
+        return HttpResponseForbidden('Invalid token')
+    try:
+        notifications = json.loads(request.body)
+        if isinstance(notifications, dict):
+            notifications = [notifications]
+        finished = filter(None, map(parse_notification, notifications))
+    except (ValueError, KeyError, TypeError, AttributeError), e:
+        return HttpResponseBadRequest('Invalid notification: %s' % e)
+    if finished:
+        JenkinsBuild.objects.bulk_create([
+            JenkinsBuild(job_name=name, number=number, succeeded=succeeded)
+            for name, number, succeeded in finished])
+    return jsonify(dict(status='ok', received=len(notifications),
+                        finished=len(finished)))
+
+
 @login_required
 def graphite_api_data(request):
     metric = request.GET.get('metric')
+    if not metric:
+        return HttpResponseBadRequest('No metric given')
     data = None
     matching_metrics = None
 
     try:
-        matching_metrics = dict(metrics=get_matching_metrics(metric))
+        matching_metrics = dict(
+            metrics=metric_index.get_matching_metrics(metric))
     except Exception, exp:
         return jsonify(dict(status='error', message=str(exp)))
 
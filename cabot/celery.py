@@ -6,6 +6,22 @@ from celery import Celery
 
 from django.conf import settings
 
+try:
+    from gevent import monkey
+except ImportError:
+    monkey = None
+
+if monkey is not None and monkey.is_module_patched('socket'):
+    # A worker on the gevent pool (`celery worker -P gevent`), which runs
+    # its HTTP checks on greenlets. Have psycopg2 wait on the database
+    # through gevent as well, or every query blocks all the greenlets.
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        pass
+    else:
+        patch_psycopg()
+
 if settings.ROLLBAR['access_token']:
     import rollbar
     rollbar.init(settings.ROLLBAR['access_token'],
@@ -1,6 +1,8 @@
 import os
 from datetime import timedelta
 
+from kombu import Queue
+
 BROKER_URL = os.environ['CELERY_BROKER_URL']
 CELERY_IMPORTS = (
     'cabot.cabotapp.tasks',
@@ -11,16 +13,45 @@ CELERY_TASK_SERIALIZER = "json"
 CELERY_ACCEPT_CONTENT = ['json', 'msgpack', 'yaml']
 CELERYD_TASK_SOFT_TIME_LIMIT = 120
 CELERYD_TASK_TIME_LIMIT = 150
+RUN_ALL_CHECKS_INTERVAL = 60
+# Seconds between refreshes of the index of metric names that answers the
+# check form's autocomplete
+METRIC_INDEX_REFRESH_INTERVAL = int(os.environ.get('METRIC_INDEX_REFRESH_INTERVAL', '300'))
+# Seconds between recording the builds the Jenkins webhook has queued, so a
+# burst of notifications is written in one go
+JENKINS_WEBHOOK_FLUSH_INTERVAL = int(os.environ.get('JENKINS_WEBHOOK_FLUSH_INTERVAL', '10'))
+
+# Checks are routed to a queue per importance, so a backlog of warnings
+# can't hold up critical checks. Run a dedicated pool per queue with e.g.
+#   celery worker -A cabot -Q checks_critical
+# Workers started without -Q consume every queue. The redis transport serves
+# lower priorities first, so shared workers pick critical checks first.
+CHECK_QUEUES = {
+    'CRITICAL': {'queue': 'checks_critical', 'priority': 0},
+    'ERROR': {'queue': 'checks_error', 'priority': 3},
+    'WARNING': {'queue': 'checks_warning', 'priority': 6},
+}
+CELERY_DEFAULT_QUEUE = 'celery'
+CELERY_QUEUES = [Queue(CELERY_DEFAULT_QUEUE)] + [
+    Queue(route['queue']) for route in CHECK_QUEUES.values()]
 
 CELERYBEAT_SCHEDULE = {
     'run-all-checks': {
         'task': 'cabot.cabotapp.tasks.run_all_checks',
-        'schedule': timedelta(seconds=60),
+        'schedule': timedelta(seconds=RUN_ALL_CHECKS_INTERVAL),
     },
     'update-shifts': {
         'task': 'cabot.cabotapp.tasks.update_shifts',
         'schedule': timedelta(seconds=1800),
     },
+    'refresh-metric-index': {
+        'task': 'cabot.cabotapp.tasks.refresh_metric_index',
+        'schedule': timedelta(seconds=METRIC_INDEX_REFRESH_INTERVAL),
+    },
+    'record-jenkins-builds': {
+        'task': 'cabot.cabotapp.tasks.record_jenkins_builds',
+        'schedule': timedelta(seconds=JENKINS_WEBHOOK_FLUSH_INTERVAL),
+    },
     'clean-db': {
         'task': 'cabot.cabotapp.tasks.clean_db',
         'schedule': timedelta(seconds=60*60*24),
@@ -1,7 +1,13 @@
 from polymorphic import PolymorphicModel
-from cabot.cabotapp import models, alert
-from rest_framework import routers, serializers, viewsets, mixins
+from django.conf import settings
+from cabot.cabotapp import models, alert, passive
+from rest_framework import (routers, serializers, viewsets, mixins, status,
+                            permissions)
+from rest_framework.response import Response
+from rest_framework.views import APIView
+import json
 import logging
+import zlib
 
 logger = logging.getLogger(__name__)
 
@@ -87,7 +93,13 @@ router.register(r'status_checks', create_viewset(
 
 router.register(r'icmp_checks', create_viewset(
     arg_model=models.ICMPStatusCheck,
-    arg_fields=status_check_fields,
+    arg_fields=status_check_fields + (
+        'icmp_probe_count',
+        'icmp_probe_interval',
+        'icmp_max_loss',
+        'icmp_max_rtt',
+        'agent',
+    ),
 ))
 
 router.register(r'graphite_checks', create_viewset(
@@ -111,6 +123,7 @@ router.register(r'http_checks', create_viewset(
         'status_code',
         'timeout',
         'verify_ssl_certificate',
+        'agent',
     ),
 ))
 
@@ -121,6 +134,111 @@ router.register(r'jenkins_checks', create_viewset(
     ),
 ))
 
+router.register(r'passive_checks', create_viewset(
+    arg_model=models.PassiveStatusCheck,
+    arg_fields=status_check_fields,
+))
+
+
+router.register(r'tcp_checks', create_viewset(
+    arg_model=models.TCPStatusCheck,
+    arg_fields=status_check_fields + (
+        'endpoint',
+        'timeout',
+        'agent',
+    ),
+))
+
+
+class PassiveResultsView(APIView):
+    """
+    Takes a list of results for passive checks, each with the check's id
+    (`check`) or `name`, `succeeded`, and optionally `error`, `raw_data`
+    and `time` (a unix timestamp). Needs permission to add check results.
+    """
+    queryset = models.StatusCheckResult.objects.none()
+
+    def post(self, request):
+        try:
+            recorded, errors = passive.ingest(request.DATA)
+        except passive.IngestError, e:
+            return Response({'detail': unicode(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'recorded': recorded,
+            'errors': [{'index': index, 'error': error}
+                       for index, error in errors],
+        })
+
+
+class IsAgent(permissions.BasePermission):
+    """
+    Lets an agent's own account, named after it, at its checks. The
+    account needs permission to add check results too.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(user and user.is_authenticated() and
+                    user.get_username() == view.kwargs.get('agent') and
+                    user.has_perm('cabotapp.add_statuscheckresult'))
+
+
+def _agent_checks(agent):
+    return models.StatusCheck.objects.filter(agent=agent, active=True)
+
+
+class AgentChecksView(APIView):
+    """
+    The definitions of the active checks an agent runs. They include the
+    checks' credentials, so only the agent's own account can fetch them.
+    """
+    permission_classes = (IsAgent,)
+
+    def get(self, request, agent):
+        checks = []
+        for check in _agent_checks(agent):
+            definition = getattr(check, 'agent_definition', lambda: None)()
+            if definition is not None:
+                definition.update(id=check.id, name=check.name,
+                                  frequency=check.frequency)
+                checks.append(definition)
+        return Response({'checks': checks})
+
+
+class AgentResultsView(APIView):
+    """
+    Takes a batch of results from an agent for its checks, as for the
+    passive results API, optionally gzipped (Content-Encoding: gzip).
+    """
+    permission_classes = (IsAgent,)
+
+    def post(self, request, agent):
+        body = request.body
+        if request.META.get('HTTP_CONTENT_ENCODING') == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = decompressor.decompress(
+                    body, settings.AGENT_MAX_UPLOAD_BYTES)
+            except zlib.error, e:
+                return Response({'detail': 'Invalid gzip body: %s' % e},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if decompressor.unconsumed_tail:
+                return Response({'detail': 'Upload too large'},
+                                status=status.HTTP_400_BAD_REQUEST)
+        try:
+            recorded, errors = passive.ingest(json.loads(body),
+                                              checks=_agent_checks(agent))
+        except ValueError, e:
+            return Response({'detail': unicode(e)},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'recorded': recorded,
+            'errors': [{'index': index, 'error': error}
+                       for index, error in errors],
+        })
+
+
 '''
 Omitting user API, could expose/allow modifying dangerous fields.
 
@@ -1,6 +1,7 @@
 import os
 import dj_database_url
 import re
+import tempfile
 from cabot.celeryconfig import *
 from cabot.cabot_config import *
 import xmlrunner
@@ -21,6 +22,25 @@ DATABASES = {'default': dj_database_url.parse(os.environ["DATABASE_URL"])}
 if not DEBUG:
     DATABASES['default']['OPTIONS'] = {'autocommit': True}
 
+# The 'metrics' cache shares metric query results between the workers on a
+# host. Point it at memcached to share them between hosts.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'metrics': {
+        'BACKEND': os.environ.get(
+            'METRIC_CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get(
+            'METRIC_CACHE_LOCATION',
+            os.path.join(tempfile.gettempdir(), 'cabot_metric_cache')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
 USE_TZ = True
 
 ALLOWED_HOSTS = os.environ.get('ALLOWED_HOSTS', '*').split(',')
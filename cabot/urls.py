@@ -5,12 +5,16 @@ from django.conf.urls import patterns, include, url
 from django.conf import settings
 from cabot.cabotapp.views import (
         run_status_check, graphite_api_data, checks_run_recently,
+        jenkins_webhook,
         duplicate_icmp_check, duplicate_graphite_check, duplicate_http_check,
         duplicate_jenkins_check, duplicate_instance, duplicate_influxdb_check,
+        duplicate_passive_check, duplicate_tcp_check,
         GraphiteCheckCreateView, GraphiteCheckUpdateView,
         InfluxDBCheckCreateView, InfluxDBCheckUpdateView,
         HttpCheckCreateView, HttpCheckUpdateView,
         ICMPCheckCreateView, ICMPCheckUpdateView,
+        PassiveCheckCreateView, PassiveCheckUpdateView,
+        TCPCheckCreateView, TCPCheckUpdateView,
         JenkinsCheckCreateView, JenkinsCheckUpdateView,
         StatusCheckDeleteView, StatusCheckListView, StatusCheckDetailView,
         AuthComplete, LoginError,
@@ -115,10 +119,23 @@ urlpatterns = patterns('',
         view=JenkinsCheckUpdateView.as_view(), name='update-jenkins-check'),
     url(r'^jenkins_check/duplicate/(?P<pk>\d+)/',
         view=duplicate_jenkins_check, name='duplicate-jenkins-check'),
+    url(r'^tcp_check/create/', view=TCPCheckCreateView.as_view(),
+        name='create-tcp-check'),
+    url(r'^tcp_check/update/(?P<pk>\d+)/',
+        view=TCPCheckUpdateView.as_view(), name='update-tcp-check'),
+    url(r'^tcp_check/duplicate/(?P<pk>\d+)/',
+        view=duplicate_tcp_check, name='duplicate-tcp-check'),
+    url(r'^passive_check/create/', view=PassiveCheckCreateView.as_view(),
+        name='create-passive-check'),
+    url(r'^passive_check/update/(?P<pk>\d+)/',
+        view=PassiveCheckUpdateView.as_view(), name='update-passive-check'),
+    url(r'^passive_check/duplicate/(?P<pk>\d+)/',
+        view=duplicate_passive_check, name='duplicate-passive-check'),
     url(r'^result/(?P<pk>\d+)/',
         view=StatusCheckResultDetailView.as_view(), name='result'),
     url(r'^shifts/', view=ShiftListView.as_view(), name='shifts'),
     url(r'^graphite/', view=graphite_api_data, name='graphite-data'),
+    url(r'^jenkins/notify/$', view=jenkins_webhook, name='jenkins-webhook'),
     url(r'^user/(?P<pk>\d+)/profile/$',
         view=UserProfileUpdateView.as_view(), name='user-profile'),
     url(r'^user/(?P<pk>\d+)/profile/(?P<alerttype>.+)',
@@ -128,6 +145,12 @@ urlpatterns = patterns('',
     # Comment below line to disable browsable rest api
     url(r'^api-auth/',
         include('rest_framework.urls', namespace='rest_framework')),
+    url(r'^api/passive_results/$', view=rest_urls.PassiveResultsView.as_view(),
+        name='passive-results'),
+    url(r'^api/agents/(?P<agent>[\w.-]+)/checks/$',
+        view=rest_urls.AgentChecksView.as_view(), name='agent-checks'),
+    url(r'^api/agents/(?P<agent>[\w.-]+)/results/$',
+        view=rest_urls.AgentResultsView.as_view(), name='agent-results'),
     url(r'^api/', include(rest_urls.router.urls)),
     url(r'^complete/(?P<backend>[^/]+)/$', AuthComplete.as_view()),
     url(r'^login-error/$', LoginError.as_view()),
@@ -0,0 +1,6 @@
+"""
+The remote probe agent, and the probes it shares with the check workers.
+
+Nothing here imports Django, so the agent can run on hosts with only
+`requests` installed.
+"""
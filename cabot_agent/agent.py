@@ -0,0 +1,345 @@
+"""
+Remote probe agent.
+
+Runs the HTTP, ICMP and TCP checks assigned to it (by their `agent` field)
+from close to their targets, rather than from the central workers. The
+agent asks the Cabot API for its checks every `--refresh` seconds, runs
+each on its own frequency and writes the results to a local spool
+directory as gzipped JSON batches. Batches are uploaded oldest first and
+removed once the server has them, so results are kept while the server
+can't be reached and sent when it's back. The last check definitions are
+kept in the spool too, so an agent restarted during an outage carries on.
+
+The agent only needs `requests`, not Django or a database. Installing
+Cabot puts it on the path as `cabot-agent`:
+
+    cabot-agent --server https://cabot.example.com \\
+        --name dc2 --password ... --spool /var/spool/cabot
+
+The agent signs in with the account named after it, which needs
+permission to add check results. It can only see and report on its own
+checks.
+"""
+from __future__ import absolute_import
+
+import argparse
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from multiprocessing.pool import ThreadPool
+
+import requests
+
+from . import icmp, probes
+
+logger = logging.getLogger(__name__)
+
+CHECKS_FILE = 'checks.json'
+BATCH_SUFFIX = '.json.gz'
+
+
+def run_http(check):
+    """Runs an HTTP check definition, as HttpStatusCheck does"""
+    if check['username']:
+        auth = (check['username'], check['password'])
+    else:
+        auth = None
+    text_match = check['text_match']
+    pattern = re.compile(text_match) if text_match is not None else None
+    try:
+        resp = requests.request(
+            method=check['http_method'],
+            url=check['endpoint'],
+            data=check['http_body'],
+            params=check['http_params'],
+            timeout=check['timeout'],
+            verify=check['verify_ssl_certificate'],
+            auth=auth,
+            allow_redirects=check['allow_http_redirects'],
+            stream=True,
+        )
+        try:
+            expected = check['status_code']
+            wrong_code = expected and resp.status_code != expected
+            raw_data, matched, complete = probes.read_http_body(
+                resp, None if wrong_code else pattern,
+                check['max_body_bytes'])
+        finally:
+            resp.close()
+    except requests.RequestException as e:
+        return False, u'Request error occurred: %s' % (e.message,), None
+    if wrong_code:
+        return False, u'Wrong code: got %s (expected %s)' % (
+            resp.status_code, expected), raw_data
+    if pattern is not None and not matched:
+        if complete:
+            error = u'Failed to find match regex /%s/ in response body' % (
+                text_match)
+        else:
+            error = (u'Failed to find match regex /%s/ in first %s bytes of '
+                     u'response body' % (text_match, check['max_body_bytes']))
+        return False, error, raw_data
+    for header, match in check['header_match']:
+        if header not in resp.headers:
+            return False, u'Missing response header: %s' % header, raw_data
+        value = resp.headers[header]
+        if not re.match(match, value):
+            return False, u'Mismatch in header: %s / %s' % (
+                header, value), raw_data
+    return True, None, raw_data
+
+
+def run_tcp(check):
+    """Runs a TCP check definition, as TCPStatusCheck does"""
+    try:
+        host, port = probes.parse_address(check['endpoint'])
+    except ValueError as e:
+        return False, e.message, None
+    connect_ms, error = probes.tcp_connect(host, port,
+                                           check['timeout'] or 10)
+    raw_data = None
+    if connect_ms is not None:
+        raw_data = json.dumps({'connect_ms': connect_ms})
+    return error is None, error, raw_data
+
+
+def icmp_outcome(check, ping):
+    """The outcome of an ICMP check definition, as ICMPStatusCheck's"""
+    stats = ping.stats()
+    raw_data = json.dumps(stats, separators=(',', ':'))
+    if not ping.received:
+        return False, ping.error or u'No reply from %s' % ping.address, \
+            raw_data
+    if stats['loss'] > check['max_loss']:
+        return False, u'Packet loss %s%% (max %s%%)' % (
+            stats['loss'], check['max_loss']), raw_data
+    if check['max_rtt'] is not None and stats['p95'] > check['max_rtt']:
+        return False, u'95th percentile RTT %s ms (max %s ms)' % (
+            stats['p95'], check['max_rtt']), raw_data
+    return True, None, raw_data
+
+
+RUNNERS = {
+    'http': run_http,
+    'tcp': run_tcp,
+}
+
+
+class Agent(object):
+
+    def __init__(self, server, name, spool_dir, auth=None,
+                 refresh_interval=60, concurrency=20, timeout=30,
+                 max_spooled_batches=10000):
+        self.server = server.rstrip('/')
+        self.name = name
+        self.spool_dir = spool_dir
+        self.refresh_interval = refresh_interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_spooled_batches = max_spooled_batches
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.checks = None
+        self.next_runs = {}
+        self.refreshed_at = None
+        self.batch_count = 0
+        if not os.path.isdir(spool_dir):
+            os.makedirs(spool_dir)
+
+    def url(self, path):
+        return '%s/api/agents/%s/%s/' % (self.server, self.name, path)
+
+    def _spool_path(self, name):
+        return os.path.join(self.spool_dir, name)
+
+    def _write_atomic(self, name, data):
+        path = self._spool_path(name)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.rename(path + '.tmp', path)
+
+    def refresh(self):
+        """
+        Fetches the agent's check definitions, falling back to the last
+        ones fetched when the server can't be reached
+        """
+        try:
+            resp = self.session.get(self.url('checks'), timeout=self.timeout)
+            resp.raise_for_status()
+            checks = resp.json()['checks']
+        except (requests.RequestException, ValueError, KeyError), e:
+            logger.warning('Could not fetch checks for agent %s: %s' % (
+                self.name, e))
+            if self.checks is None:
+                try:
+                    with open(self._spool_path(CHECKS_FILE)) as f:
+                        checks = json.load(f)
+                except (IOError, ValueError):
+                    return
+            else:
+                return
+        else:
+            self._write_atomic(CHECKS_FILE, json.dumps(checks))
+        self.checks = dict((check['id'], check) for check in checks
+                           if check['type'] == 'icmp' or
+                           check['type'] in RUNNERS)
+        for check_id in set(self.next_runs) - set(self.checks):
+            del self.next_runs[check_id]
+
+    def due_checks(self, now):
+        return [check for check_id, check in sorted(self.checks.items())
+                if self.next_runs.get(check_id, 0) <= now]
+
+    def run_checks(self, checks):
+        """
+        Runs `checks` and returns their results as sent to the server.
+        ICMP checks with the same options share a round of pings.
+        """
+        outcomes = {}
+        pings = {}
+        for check in checks:
+            if check['type'] == 'icmp':
+                options = tuple(sorted(check['options'].items()))
+                pings.setdefault(options, set()).add(check['address'])
+        for options, addresses in pings.items():
+            pings[options] = icmp.ping_hosts(addresses, **dict(options))
+        others = []
+        for check in checks:
+            if check['type'] == 'icmp':
+                options = tuple(sorted(check['options'].items()))
+                outcomes[check['id']] = icmp_outcome(
+                    check, pings[options][check['address']])
+            else:
+                others.append(check)
+        if others:
+            pool = ThreadPool(min(self.concurrency, len(others)))
+            try:
+                for check, outcome in zip(others, pool.map(
+                        lambda check: self._run_one(check), others)):
+                    outcomes[check['id']] = outcome
+            finally:
+                pool.terminate()
+        now = time.time()
+        return [{
+            'check': check['id'],
+            'succeeded': outcomes[check['id']][0],
+            'error': outcomes[check['id']][1],
+            'raw_data': outcomes[check['id']][2],
+            'time': now,
+        } for check in checks]
+
+    def _run_one(self, check):
+        try:
+            return RUNNERS[check['type']](check)
+        except Exception as e:
+            return False, u'Error in performing check: %s' % (e,), None
+
+    def spool(self, results):
+        """Writes a batch of results to the spool directory"""
+        self.batch_count += 1
+        name = '%015d-%06d%s' % (time.time() * 1000, self.batch_count,
+                                 BATCH_SUFFIX)
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        data = compressor.compress(json.dumps(results)) + compressor.flush()
+        self._write_atomic(name, data)
+        batches = self.spooled_batches()
+        for old in batches[:max(0, len(batches) - self.max_spooled_batches)]:
+            logger.error('Spool full, dropping results batch %s' % old)
+            os.remove(self._spool_path(old))
+
+    def spooled_batches(self):
+        return sorted(name for name in os.listdir(self.spool_dir)
+                      if name.endswith(BATCH_SUFFIX))
+
+    def upload(self):
+        """
+        Uploads spooled batches, oldest first, until one fails. Returns the
+        number uploaded.
+        """
+        uploaded = 0
+        for name in self.spooled_batches():
+            path = self._spool_path(name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            try:
+                resp = self.session.post(
+                    self.url('results'), data=data, timeout=self.timeout,
+                    headers={'Content-Type': 'application/json',
+                             'Content-Encoding': 'gzip'})
+            except requests.RequestException, e:
+                logger.warning('Could not upload results: %s' % e)
+                break
+            if resp.status_code == 400:
+                # Retrying won't help
+                logger.error('Results batch %s rejected: %s' % (
+                    name, resp.text))
+            elif resp.status_code != 200:
+                logger.warning('Could not upload results: %s %s' % (
+                    resp.status_code, resp.text))
+                break
+            else:
+                errors = resp.json().get('errors')
+                if errors:
+                    logger.warning('Results not recorded: %s' % errors)
+            os.remove(path)
+            uploaded += 1
+        return uploaded
+
+    def run_once(self, now=None):
+        """
+        Refreshes the checks if due, runs the checks that are due, spools
+        their results and uploads the spool. Returns the number of checks
+        run.
+        """
+        now = now or time.time()
+        if self.refreshed_at is None or \
+                now - self.refreshed_at >= self.refresh_interval:
+            self.refresh()
+            self.refreshed_at = now
+        due = self.due_checks(now) if self.checks else []
+        if due:
+            for check in due:
+                self.next_runs[check['id']] = now + check['frequency'] * 60
+            self.spool(self.run_checks(due))
+        self.upload()
+        return len(due)
+
+    def run_forever(self, interval=1):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception('Agent %s run failed' % self.name)
+            time.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Runs the Cabot checks assigned to an agent')
+    parser.add_argument('--server', required=True,
+                        help='Base URL of the Cabot server')
+    parser.add_argument('--name', required=True,
+                        help="Agent name, as set in the checks' agent field "
+                             "and the username of its Cabot account")
+    parser.add_argument('--password', help="Password of the agent's account",
+                        default=os.environ.get('CABOT_AGENT_PASSWORD'))
+    parser.add_argument('--spool', required=True,
+                        help='Directory for results waiting to be uploaded')
+    parser.add_argument('--refresh', type=int, default=60,
+                        help='Seconds between fetches of the check list')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='HTTP and TCP checks run at once')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    Agent(args.server, args.name, args.spool,
+          auth=(args.name, args.password),
+          refresh_interval=args.refresh,
+          concurrency=args.concurrency).run_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+In-process ICMP echo ("ping") engine.
+
+Probes go out over an unprivileged Linux datagram ICMP socket, allowed for
+the groups in the `net.ipv4.ping_group_range` sysctl, so there's no `ping`
+process per probe and no need for root. All hosts share one socket and are
+probed at once; each probe times out on its own. Where datagram ICMP
+sockets aren't available we fall back to running `ping` for every host
+concurrently.
+"""
+from __future__ import absolute_import
+
+import errno
+import logging
+import math
+import os
+import re
+import select
+import socket
+import struct
+import subprocess
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+ICMP_ECHO_REPLY = 0
+ICMP_ECHO_REQUEST = 8
+_HEADER = struct.Struct('!BBHHH')
+_PAYLOAD = 'cabot-icmp-probe'
+# The shortest interval, in seconds, the ping fallback can use when not
+# running as root
+MIN_USER_PING_INTERVAL = 0.2
+
+
+class PingResult(object):
+    """Probes sent to an address and the round trip times of the replies"""
+
+    def __init__(self, address):
+        self.address = address
+        self.sent = 0
+        self.rtts = []
+        self.error = None
+
+    @property
+    def received(self):
+        return len(self.rtts)
+
+    @property
+    def loss(self):
+        """Percentage of the probes sent that got no reply"""
+        if not self.sent:
+            return 100.0
+        return 100.0 * (self.sent - self.received) / self.sent
+
+    def stats(self):
+        """
+        Compact summary of the run: probes sent and received, loss
+        percentage and min/avg/p95/max round trip times in milliseconds
+        """
+        stats = {
+            'sent': self.sent,
+            'received': self.received,
+            'loss': round(self.loss, 1),
+        }
+        if self.rtts:
+            rtts = sorted(1000 * rtt for rtt in self.rtts)
+            stats.update({
+                'min': round(rtts[0], 3),
+                'avg': round(sum(rtts) / len(rtts), 3),
+                'p95': round(percentile(rtts, 95), 3),
+                'max': round(rtts[-1], 3),
+            })
+        return stats
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted `values`"""
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+def _checksum(data):
+    if len(data) % 2:
+        data += '\0'
+    total = sum(struct.unpack('!%dH' % (len(data) // 2), data))
+    total = (total >> 16) + (total & 0xffff)
+    total += total >> 16
+    return ~total & 0xffff
+
+
+def _echo_request(seq):
+    header = _HEADER.pack(ICMP_ECHO_REQUEST, 0, 0, 0, seq)
+    checksum = _checksum(header + _PAYLOAD)
+    return _HEADER.pack(ICMP_ECHO_REQUEST, 0, checksum, 0, seq) + _PAYLOAD
+
+
+def _open_socket():
+    return socket.socket(socket.AF_INET, socket.SOCK_DGRAM,
+                         socket.IPPROTO_ICMP)
+
+
+def datagram_sockets_available():
+    try:
+        _open_socket().close()
+    except socket.error:
+        return False
+    return True
+
+
+def ping_hosts(addresses, count=1, interval=0.2, timeout=2.0):
+    """
+    Sends `count` echo requests, `interval` seconds apart, to every address
+    at once, and waits up to `timeout` seconds for the reply to each.
+    Returns a dict of address -> `PingResult`.
+    """
+    results = dict((address, PingResult(address)) for address in addresses)
+    if not results:
+        return results
+    try:
+        sock = _open_socket()
+    except socket.error as e:
+        logger.warning('Datagram ICMP sockets unavailable (%s), '
+                       'falling back to ping' % e)
+        _ping_subprocess(results, count, interval, timeout)
+        return results
+    try:
+        _ping_socket(sock, results, count, interval, timeout)
+    finally:
+        sock.close()
+    return results
+
+
+def _ping_socket(sock, results, count, interval, timeout):
+    hosts = {}
+    for address, result in results.items():
+        try:
+            ip = socket.gethostbyname(address)
+        except socket.error as e:
+            result.error = u'Could not resolve %s: %s' % (address, e)
+            continue
+        hosts.setdefault(ip, []).append(result)
+    sock.setblocking(False)
+    start = time.time()
+    sends = [(start + probe * interval, host)
+             for probe in range(count) for host in sorted(hosts)]
+    next_send = 0
+    # seq -> (ip, time sent), oldest first
+    pending = OrderedDict()
+    seq = struct.unpack('!H', os.urandom(2))[0]
+    while next_send < len(sends) or pending:
+        now = time.time()
+        while next_send < len(sends) and sends[next_send][0] <= now:
+            ip = sends[next_send][1]
+            next_send += 1
+            seq = (seq + 1) & 0xffff
+            for result in hosts[ip]:
+                result.sent += 1
+            try:
+                sock.sendto(_echo_request(seq), (ip, 0))
+            except socket.error as e:
+                for result in hosts[ip]:
+                    result.error = u'Error sending to %s: %s' % (ip, e)
+                continue
+            pending[seq] = (ip, now)
+        while pending:
+            oldest = next(iter(pending))
+            if pending[oldest][1] + timeout > now:
+                break
+            del pending[oldest]
+        wake = []
+        if pending:
+            wake.append(pending[next(iter(pending))][1] + timeout)
+        if next_send < len(sends):
+            wake.append(sends[next_send][0])
+        if not wake:
+            break
+        readable, _, _ = select.select(
+            [sock], [], [], max(0, min(wake) - time.time()))
+        if not readable:
+            continue
+        while True:
+            try:
+                data, (ip, _) = sock.recvfrom(1024)
+            except socket.error as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    logger.debug('Error receiving ICMP reply: %s' % e)
+                break
+            received_at = time.time()
+            if len(data) < _HEADER.size:
+                continue
+            icmp_type, _, _, _, reply_seq = _HEADER.unpack(
+                data[:_HEADER.size])
+            if icmp_type != ICMP_ECHO_REPLY:
+                continue
+            probe = pending.get(reply_seq)
+            if probe is None or probe[0] != ip:
+                continue
+            del pending[reply_seq]
+            for result in hosts[ip]:
+                result.rtts.append(received_at - probe[1])
+
+
+def _ping_subprocess(results, count, interval, timeout):
+    if os.geteuid() != 0:
+        # ping refuses anyone but root shorter intervals
+        interval = max(interval, MIN_USER_PING_INTERVAL)
+    processes = []
+    for address, result in results.items():
+        try:
+            process = subprocess.Popen(
+                ['ping', '-n', '-c', str(count), '-i', str(interval),
+                 '-W', str(int(math.ceil(timeout))), address],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        except OSError as e:
+            result.error = u'Could not run ping: %s' % e
+            continue
+        processes.append((result, process))
+    for result, process in processes:
+        output = process.communicate()[0]
+        result.sent = count
+        result.rtts = [float(ms) / 1000
+                       for ms in re.findall(r'time=([\d.]+) ms', output)]
+        if not result.rtts:
+            result.error = output
@@ -0,0 +1,84 @@
+"""
+Probes shared by the check workers and the remote agent.
+
+The agent runs without Django near the targets it checks, so this module
+only uses the standard library.
+"""
+from __future__ import absolute_import
+
+import errno
+import socket
+import time
+
+RAW_DATA_LIMIT = 500000
+# Size of the reads when streaming HTTP check responses
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+def read_http_body(resp, pattern, max_bytes):
+    """
+    Reads a streamed response body, stopping as soon as the compiled regex
+    `pattern` matches or `max_bytes` have been read. Without a pattern only
+    the `raw_data` prefix is read. Returns `(prefix, matched, complete)`:
+    the first RAW_DATA_LIMIT bytes, whether the pattern matched and whether
+    the whole body was read.
+
+    The body read so far is searched each time it doubles in size, so a
+    match spanning chunks is still found without rescanning the body for
+    every chunk.
+    """
+    if pattern is None:
+        max_bytes = RAW_DATA_LIMIT
+    chunks = []
+    size = 0
+    checkpoint = BODY_CHUNK_SIZE
+    complete = True
+    for chunk in resp.iter_content(BODY_CHUNK_SIZE):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size > max_bytes:
+            complete = False
+            break
+        if pattern is not None and size >= checkpoint:
+            body = ''.join(chunks)
+            chunks = [body]
+            if pattern.search(body):
+                return body[:RAW_DATA_LIMIT], True, complete
+            checkpoint = size * 2
+    body = ''.join(chunks)[:max_bytes]
+    matched = pattern is not None and pattern.search(body) is not None
+    return body[:RAW_DATA_LIMIT], matched, complete
+
+
+def parse_address(address):
+    """'host:port' or '[v6 address]:port' -> (host, port)"""
+    host, sep, port = address.strip().rpartition(':')
+    if not sep or not host:
+        raise ValueError(u'Address %s should be host:port' % address)
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError(u'Invalid port in address %s' % address)
+    if not 0 < port < 65536:
+        raise ValueError(u'Invalid port in address %s' % address)
+    return host.strip('[]'), port
+
+
+def tcp_connect(host, port, timeout):
+    """
+    Opens and closes a TCP connection to `host`:`port`. Returns the
+    milliseconds the connection took to open, and None, or None and the
+    error.
+    """
+    start = time.time()
+    try:
+        sock = socket.create_connection((host, port), timeout)
+    except socket.timeout:
+        return None, u'Timed out connecting to %s:%s after %ss' % (
+            host, port, timeout)
+    except socket.error, e:
+        reason = e.strerror or errno.errorcode.get(e.errno) or str(e)
+        return None, u'Error connecting to %s:%s: %s' % (host, port, reason)
+    connect_ms = round((time.time() - start) * 1000, 3)
+    sock.close()
+    return connect_ms, None
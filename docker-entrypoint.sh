@@ -15,10 +15,10 @@ case "$1" in
     set -- gunicorn cabot.wsgi:application --config gunicorn.conf
     ;;
 "beatworker")
-    set -- celery worker -B -A cabot --loglevel=INFO --concurrency=16 -Ofair
+    set -- celery worker -B -A cabot --loglevel=INFO --concurrency=16 -Ofair -P gevent
     ;;
 "worker")
-    set -- celery worker -A cabot --loglevel=INFO --concurrency=16 -Ofair
+    set -- celery worker -A cabot --loglevel=INFO --concurrency=16 -Ofair -P gevent
     ;;
 esac
 
@@ -26,4 +26,9 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     zip_safe=False,
+    entry_points={
+        'console_scripts': [
+            'cabot-agent = cabot_agent.agent:main',
+        ],
+    },
 )